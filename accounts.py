@@ -0,0 +1,70 @@
+import os
+
+from flask import current_app, request
+from werkzeug.local import LocalProxy
+
+import hashing
+
+# The current application's database and password hasher, made by create_app()
+db = LocalProxy(lambda: current_app.extensions["db"])
+hasher = LocalProxy(lambda: current_app.extensions["hasher"])
+
+# Throttle password attempts per address and per username, across the site and the API
+address_throttle = hashing.Throttle(int(os.getenv("LOGIN_ATTEMPTS_PER_ADDRESS", 20)))
+username_throttle = hashing.Throttle(int(os.getenv("LOGIN_ATTEMPTS_PER_USERNAME", 5)))
+
+# Number of transactions shown per page of history
+HISTORY_PAGE_SIZE = 50
+
+
+class LoginError(Exception):
+    """Raised when a username and password can't be logged in, with a message fit for apology() and a status."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def authenticate(username, password):
+    """Return the id of the user with username and password, raising LoginError if they don't match."""
+
+    # Ensure neither this address nor this username is guessing passwords
+    if not (address_throttle.allow(request.remote_addr) and username_throttle.allow(username)):
+        raise LoginError("too many attempts", 429)
+
+    # Query database for username
+    rows = db.execute("SELECT id, hash FROM users WHERE username = :username", username=username)
+
+    # Ensure username exists and password is correct
+    try:
+        if len(rows) != 1 or not hasher.check(rows[0]["hash"], password):
+            raise LoginError("invalid username and/or password", 403)
+    except hashing.Busy:
+        raise LoginError("try again later", 503)
+    username_throttle.reset(username)
+
+    # Upgrade hash made with outdated parameters while the password is at hand
+    if hasher.needs_rehash(rows[0]["hash"]):
+        try:
+            db.execute("UPDATE users SET hash = :hash WHERE id = :user_id",
+                       hash=hasher.generate(password), user_id=rows[0]["id"])
+        except hashing.Busy:
+            pass
+    return rows[0]["id"]
+
+
+def history_page(user_id, before, limit):
+    """Return up to limit of user's transactions older than id before, newest first."""
+    return db.execute("SELECT * FROM history WHERE fkey = :user_id AND id < :before ORDER BY id DESC LIMIT :limit",
+                      user_id=user_id, before=before or 2 ** 63 - 1, limit=limit)
+
+
+def history_rows(user_id):
+    """Yield all of user's transactions newest first, fetching them in chunks."""
+    before = None
+    while True:
+        rows = history_page(user_id, before, HISTORY_PAGE_SIZE * 10)
+        yield from rows
+        if len(rows) < HISTORY_PAGE_SIZE * 10:
+            return
+        before = rows[-1]["id"]
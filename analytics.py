@@ -0,0 +1,150 @@
+import logging
+import threading
+import time
+
+from helpers import cents
+
+# Failed leaderboard refreshes are logged, and the last leaderboard is kept
+log = logging.getLogger(__name__)
+
+
+def update(db, user_id, symbol, shares, price, realized=0):
+    """Add a trade, with negative shares for a sale, to today's rollup for user and symbol."""
+    db.execute("INSERT INTO rollups (fkey, symbol, day, bought, sold, volume, realized) "
+               "VALUES (:user_id, :symbol, :day, :bought, :sold, :volume, :realized) "
+               "ON CONFLICT (fkey, symbol, day) DO UPDATE SET bought = bought + excluded.bought, "
+               "sold = sold + excluded.sold, volume = volume + excluded.volume, realized = realized + excluded.realized",
+               user_id=user_id, symbol=symbol, day=time.strftime("%Y-%m-%d", time.gmtime()),
+               bought=max(shares, 0), sold=max(-shares, 0), volume=cents(abs(shares) * price), realized=cents(realized))
+
+    # Keep site-wide totals per symbol and per day, so admin views never scan trades
+    db.execute("INSERT INTO symbol_stats (symbol, held, volume, trades) VALUES (:symbol, :shares, :volume, 1) "
+               "ON CONFLICT (symbol) DO UPDATE SET held = held + excluded.held, volume = volume + excluded.volume, "
+               "trades = trades + 1", symbol=symbol, shares=shares, volume=cents(abs(shares) * price))
+    db.execute("INSERT INTO daily_stats (day, volume, trades) VALUES (:day, :volume, 1) "
+               "ON CONFLICT (day) DO UPDATE SET volume = volume + excluded.volume, trades = trades + 1",
+               day=time.strftime("%Y-%m-%d", time.gmtime()), volume=cents(abs(shares) * price))
+
+
+def performance(db, user_id, positions, quotes):
+    """
+    Return per-symbol performance rows and their totals for user.
+
+    Realized P&L and volume come from rollups; cost basis from positions; and
+    unrealized P&L from quotes, so the work grows with symbols, not trades.
+    """
+    rollups = db.execute("SELECT symbol, SUM(realized) AS realized, SUM(volume) AS volume FROM rollups "
+                         "WHERE fkey = :user_id GROUP BY symbol", user_id=user_id)
+    rows = {row["symbol"]: dict(symbol=row["symbol"], share=0, average=None, cost=0, unrealized=None,
+                                realized=row["realized"] / 100, volume=row["volume"] / 100) for row in rollups}
+
+    # Value open positions at their latest price
+    for position in positions:
+        row = rows.setdefault(position["symbol"], dict(symbol=position["symbol"], realized=0, volume=0))
+        row["share"] = position["share"]
+        row["cost"] = position["cost"]
+        row["average"] = position["cost"] / position["share"]
+        quote = quotes.get(position["symbol"].upper())
+        row["unrealized"] = position["share"] * quote["price"] - position["cost"] if quote else None
+
+    rows = sorted(rows.values(), key=lambda row: row["symbol"])
+    totals = dict(cost=sum(row["cost"] for row in rows),
+                  realized=sum(row["realized"] for row in rows),
+                  unrealized=sum(row["unrealized"] or 0 for row in rows),
+                  volume=sum(row["volume"] for row in rows))
+    return rows, totals
+
+
+def standings(db, lookup_many):
+    """
+    Return every user's id, username and portfolio value, richest first, and
+    each user's rank by id.
+
+    Each distinct symbol is quoted once, and positions are valued for all
+    users at once with numpy. Positions without a quote count as worth nothing.
+    """
+
+    # Import numpy only once standings are needed, as it's slow to import
+    import numpy as np
+
+    users = db.execute("SELECT id, username, cash FROM users ORDER BY id")
+    positions = db.execute("SELECT fkey, symbol, share FROM buy")
+    ids = np.array([row["id"] for row in users], dtype=np.int64)
+    values = np.array([row["cash"] for row in users], dtype=np.float64)
+
+    # Price each distinct symbol once, then add every position to its owner's value
+    if positions:
+        symbols, column = np.unique([row["symbol"].upper() for row in positions], return_inverse=True)
+        quotes = lookup_many(symbols.tolist())
+        prices = np.array([quotes[symbol]["price"] if symbol in quotes else 0 for symbol in symbols])
+        owners = np.searchsorted(ids, [row["fkey"] for row in positions])
+        shares = np.array([row["share"] for row in positions], dtype=np.float64)
+        values += np.bincount(owners, weights=shares * prices[column], minlength=len(ids))
+
+    order = np.argsort(-values, kind="stable")
+    rows = [dict(id=users[i]["id"], username=users[i]["username"], value=float(values[i])) for i in order]
+    return rows, {row["id"]: rank for rank, row in enumerate(rows, 1)}
+
+
+class Leaderboard:
+    """
+    Standings recomputed by a background loop once per interval.
+
+    Requests read the last standings and never wait for a recomputation,
+    except for the very first one after startup.
+    """
+
+    def __init__(self, db, lookup_many, interval=60):
+        self.db = db
+        self.lookup_many = lookup_many
+        self.interval = interval
+        self._standings = ([], {})
+        self._ready = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start recomputing in the background, once."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="leaderboard", daemon=True)
+                self._thread.start()
+
+    def get(self):
+        """Return the last standings' rows and ranks."""
+        self.start()
+        self._ready.wait()
+        return self._standings
+
+    def _run(self):
+        """Recompute forever, giving the database connection back between rounds."""
+        while True:
+            started = time.monotonic()
+            try:
+                self._standings = standings(self.db, self.lookup_many)
+            except Exception:
+                log.exception("Failed to rank portfolios")
+            finally:
+                self.db.release()
+                self._ready.set()
+            time.sleep(max(0, self.interval - (time.monotonic() - started)))
+
+
+def overview(db, lookup_many, days=14):
+    """Return site-wide totals, per-symbol stats (most traded first) and the last days of volume."""
+    totals = db.execute("SELECT users, cash FROM site_stats")[0]
+    symbols = db.execute("SELECT symbol, held, volume, trades FROM symbol_stats ORDER BY volume DESC")
+
+    # Value what everyone holds once per symbol
+    quotes = lookup_many([row["symbol"] for row in symbols if row["held"]])
+    for row in symbols:
+        quote = quotes.get(row["symbol"].upper())
+        row["value"] = row["held"] * quote["price"] if quote else None
+        row["volume"] /= 100
+    totals["holdings"] = sum(row["value"] or 0 for row in symbols)
+    totals["aum"] = totals["cash"] + totals["holdings"]
+    totals["trades"] = sum(row["trades"] for row in symbols)
+
+    daily = db.execute("SELECT day, volume / 100.0 AS volume, trades FROM daily_stats ORDER BY day DESC LIMIT :days",
+                       days=days)
+    return totals, symbols, daily
@@ -0,0 +1,208 @@
+import gzip
+import hashlib
+import json
+import secrets
+import time
+
+from flask import Blueprint, Response, current_app, g, request
+from functools import wraps
+from werkzeug.exceptions import HTTPException
+
+import portfolio
+import trades
+from accounts import HISTORY_PAGE_SIZE, LoginError, authenticate, db, history_page
+from helpers import lookup, lookup_many
+
+# Use orjson if it's installed, as it's several times faster than json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Versioned JSON API, for machine clients, with raw numbers instead of formatted text
+bp = Blueprint("api", __name__, url_prefix="/api/v1")
+
+# Smallest response worth compressing, in bytes
+GZIP_MIN_SIZE = 512
+
+# Most unexpired tokens a user keeps, dropping the oldest beyond that
+TOKENS_PER_USER = 10
+
+
+def respond(data, status=200):
+    """Return data as a JSON response, gzipped if the client accepts it and it's big enough."""
+    if orjson is not None:
+        body = orjson.dumps(data)
+    else:
+        body = json.dumps(data, separators=(",", ":")).encode()
+    response = Response(body, status=status, mimetype="application/json")
+    response.vary.add("Accept-Encoding")
+    if len(body) >= GZIP_MIN_SIZE and "gzip" in request.headers.get("Accept-Encoding", ""):
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+def error(message, status=400):
+    """Return message as a JSON error response."""
+    return respond({"error": message}, status)
+
+
+def token_required(f):
+    """Decorate API routes to require an Authorization: Bearer token from /api/v1/tokens."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        rows = []
+        if scheme.lower() == "bearer" and token:
+            rows = db.execute("SELECT hash, fkey FROM tokens WHERE hash = :hash AND expires > :now",
+                                          hash=digest(token), now=int(time.time()))
+        if not rows:
+            return error("unauthorized", 401)
+        g.token = rows[0]["hash"]
+        g.user_id = rows[0]["fkey"]
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def digest(token):
+    """Return the hash a token is stored as, so a leaked table doesn't leak tokens."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def payload():
+    """Return the request's JSON object, or its form."""
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else request.form
+
+
+@bp.errorhandler(HTTPException)
+def http_error(e):
+    """Answer errors in JSON rather than with an apology page."""
+    return error(e.name.lower(), e.code)
+
+
+@bp.route("/tokens", methods=["POST"])
+def tokens():
+    """Issue a bearer token for a username and password"""
+    data = payload()
+    username = data.get("username")
+    password = data.get("password")
+    if not username or not password:
+        return error("must provide username and password", 400)
+    if not isinstance(username, str) or not isinstance(password, str):
+        return error("invalid username and/or password", 400)
+    try:
+        user_id = authenticate(username, password)
+    except LoginError as e:
+        return error(str(e), e.status)
+
+    # Issue a token, forgetting expired ones and the user's oldest beyond TOKENS_PER_USER
+    token = secrets.token_urlsafe(32)
+    now = int(time.time())
+    expires = now + current_app.config["TOKEN_LIFETIME"]
+    with db.transaction():
+        db.execute("DELETE FROM tokens WHERE expires <= :now", now=now)
+        db.execute("INSERT INTO tokens (hash, fkey, created, expires) "
+                               "VALUES (:hash, :user_id, :created, :expires)",
+                               hash=digest(token), user_id=user_id, created=now, expires=expires)
+        db.execute("DELETE FROM tokens WHERE hash IN (SELECT hash FROM tokens WHERE fkey = :user_id "
+                               "ORDER BY created DESC, rowid DESC LIMIT -1 OFFSET :keep)", user_id=user_id, keep=TOKENS_PER_USER)
+    return respond({"token": token, "expires": expires}, 201)
+
+
+@bp.route("/tokens", methods=["DELETE"])
+@token_required
+def revoke():
+    """Revoke the bearer token the request was made with"""
+    db.execute("DELETE FROM tokens WHERE hash = :hash", hash=g.token)
+    return Response(status=204)
+
+
+@bp.route("/portfolio")
+@token_required
+def holdings():
+    """Return cash and each position with its cost basis, price and value"""
+    positions, cash = portfolio.holdings(db, g.user_id)
+    quotes = lookup_many([row["symbol"] for row in positions])
+
+    rows = []
+    for row in positions:
+        quote = quotes.get(row["symbol"].upper())
+        price = quote["price"] if quote else None
+        rows.append({"symbol": row["symbol"], "shares": row["share"], "cost": row["cost"], "price": price,
+                     "value": row["share"] * price if quote else None})
+    return respond({"cash": cash, "positions": rows,
+                    "total": cash + sum(row["value"] or 0 for row in rows)})
+
+
+@bp.route("/quote")
+@token_required
+def quote():
+    """Return the quote for ?symbol="""
+    symbol = request.args.get("symbol", "").strip()
+    if not symbol:
+        return error("missing symbol", 400)
+    quote = lookup(symbol)
+    if quote is None:
+        return error("invalid symbol", 404)
+    return respond(quote)
+
+
+@bp.route("/quotes")
+@token_required
+def quotes():
+    """Return quotes for comma-separated ?symbols=, leaving out invalid ones"""
+    symbols = [symbol.strip() for symbol in request.args.get("symbols", "").split(",") if symbol.strip()]
+    if not symbols:
+        return error("missing symbols", 400)
+    if len(symbols) > 100:
+        return error("too many symbols", 400)
+    return respond(lookup_many(symbols))
+
+
+@bp.route("/buy", methods=["POST"])
+@token_required
+def buy():
+    """Buy {"symbol", "shares"} at the current price"""
+    return trade("buy")
+
+
+@bp.route("/sell", methods=["POST"])
+@token_required
+def sell():
+    """Sell {"symbol", "shares"} at the current price"""
+    return trade("sell")
+
+
+def trade(side):
+    """Fill a market order for side from the request, returning it with its price."""
+    data = payload()
+    try:
+        side, symbol, shares = trades.parse_order(side, data.get("symbol"), data.get("shares"))
+        quote = lookup(symbol)
+        if quote is None:
+            raise trades.TradeError("invalid symbol")
+        if side == "buy":
+            trades.buy(db, g.user_id, quote["symbol"], shares, quote["price"])
+        else:
+            trades.sell(db, g.user_id, quote["symbol"], shares, quote["price"])
+    except trades.TradeError as e:
+        return error(str(e), 400)
+    return respond({"side": side, "symbol": quote["symbol"], "shares": shares, "price": quote["price"]})
+
+
+@bp.route("/history")
+@token_required
+def history():
+    """Return transactions newest first, continuing from ?before= the last page's next cursor"""
+    before = request.args.get("before", type=int)
+    limit = min(request.args.get("limit", HISTORY_PAGE_SIZE, type=int), 1000)
+    if limit < 1:
+        return error("invalid limit", 400)
+    rows = history_page(g.user_id, before, limit)
+    return respond({
+        "transactions": [{"id": row["id"], "symbol": row["symbol"], "shares": row["share"],
+                          "price": row["price"] / 100, "time": row["time"]} for row in rows],
+        "next": rows[-1]["id"] if len(rows) == limit else None,
+    })
@@ -1,91 +1,226 @@
+import json
 import os
+import queue
+import threading
+import time
 
-from cs50 import SQL
-from flask import Flask, flash, redirect, render_template, request, session
+from flask import Blueprint, Flask, Response, current_app, flash, jsonify, redirect, render_template, request, session, stream_template
 from flask_session import Session
 from tempfile import mkdtemp
 from werkzeug.exceptions import default_exceptions
-from werkzeug.security import check_password_hash, generate_password_hash
-from datetime import datetime
+from werkzeug.local import LocalProxy
+
+import analytics
+import api
+import caching
+import hashing
+import metrics
+import orders
+import portfolio
+import trades
+from accounts import HISTORY_PAGE_SIZE, LoginError, authenticate, db, hasher, history_page, history_rows
+from config import profiles
+from database import Database
+from helpers import (apology, from_cents, login_required, lookup, lookup_many, precompile_templates, price_store,
+                     quote_cache, quote_provider, symbol_directory, timestamp, usd)
+from schema import migrate
+from sessions import SqliteSessionInterface
+from streams import PricePoller
+
+# Routes, registered on each application by create_app()
+bp = Blueprint("finance", __name__)
+
+# The current application's order scheduler, made by create_app()
+scheduler = LocalProxy(lambda: current_app.extensions["scheduler"])
+
+# Number of portfolios shown on the leaderboard
+LEADERBOARD_SIZE = 25
+
+# Longest range of prices a chart covers, in days
+MAX_CHART_DAYS = 3650
+
+# Users allowed to see site-wide stats, as a comma-separated ADMIN_USERNAMES
+ADMIN_USERNAMES = {username.strip() for username in os.getenv("ADMIN_USERNAMES", "").split(",") if username.strip()}
+
+# Poll prices of streamed portfolios once per quote TTL by default
+poller = PricePoller(lookup_many, interval=float(os.getenv("STREAM_INTERVAL", os.getenv("QUOTE_TTL", 60))))
+
+# Application created on first access to application.app, as by flask run or gunicorn application:app
+_app = None
+_app_lock = threading.Lock()
+
+
+def create_app(config=None):
+    """
+    Create the application from a config profile's name or object (APP_CONFIG by default).
+
+    Nothing is connected or fetched until the first request needs it, but a
+    quote provider that can't be built (e.g. without API_KEY) fails here.
+    """
+    app = Flask(__name__)
+    app.config.from_object(profiles[config or os.getenv("APP_CONFIG", "development")]
+                           if config is None or isinstance(config, str) else config)
+
+    # Ensure quotes can be fetched, rather than every symbol looking invalid
+    quote_provider()
+
+    # Pool of connections to SQLite database, migrated when first used
+    database = Database(app.config["DATABASE"], pool_size=app.config["DATABASE_POOL_SIZE"])
+    database.setup = migrate
+    database.observe = lambda seconds: metrics.observe("db", seconds)
+    app.extensions["db"] = database
+
+    # Hash passwords in worker processes
+    app.extensions["hasher"] = hashing.HashingService(method=app.config["PASSWORD_METHOD"],
+                                                      workers=app.config["HASH_WORKERS"],
+                                                      max_queue=app.config["HASH_QUEUE"])
+
+    # Check limit and stop orders against prices, and rank portfolios once per quote TTL, from the first request on
+    app.extensions["scheduler"] = orders.OrderScheduler(database, lookup_many, interval=app.config["ORDER_INTERVAL"])
+    app.extensions["leaderboard"] = analytics.Leaderboard(database, lookup_many, interval=max(1, quote_cache.ttl))
+
+    # Custom filter
+    app.jinja_env.filters["usd"] = usd
+    app.jinja_env.filters["cents"] = from_cents
+    app.jinja_env.filters["timestamp"] = timestamp
+
+    # Link static files by content, so browsers can keep them until they change
+    app.jinja_env.globals["static_url"] = lambda filename: caching.static_url(app.static_folder, filename)
+
+    # Compile every template up front, sharing bytecode between workers
+    if app.config["PRECOMPILE_TEMPLATES"]:
+        precompile_templates(app)
+
+    # Configure session to use SESSION_BACKEND: filesystem, sqlite (shared by workers) or cookie (signed)
+    app.config["SESSION_PERMANENT"] = False
+    if app.config["SESSION_BACKEND"] == "sqlite":
+        app.session_interface = SqliteSessionInterface(database, lifetime=app.config["SESSION_LIFETIME"])
+    elif app.config["SESSION_BACKEND"] == "cookie":
+        if not app.secret_key:
+            raise RuntimeError("SECRET_KEY not set")
+    else:
+        app.config["SESSION_FILE_DIR"] = mkdtemp()
+        app.config["SESSION_TYPE"] = "filesystem"
+        Session(app)
+
+    # Bound the portfolio streams served at once, as each holds a worker thread
+    app.extensions["streams"] = threading.BoundedSemaphore(app.config["STREAM_LIMIT"]) if app.config["STREAM_LIMIT"] else None
+
+    # Time requests, SQL, quotes and templates, exposing them on /metrics
+    metrics.init_app(app, quote_cache, server_timing=bool(os.getenv("SERVER_TIMING")))
 
-from helpers import apology, login_required, lookup, usd
+    app.register_blueprint(bp)
+    app.register_blueprint(api.bp)
 
-# Ensure environment variable is set
-if not os.environ.get("API_KEY"):
-    raise RuntimeError("API_KEY not set")
+    # listen for errors
+    for code in default_exceptions:
+        app.errorhandler(code)(errorhandler)
+    return app
 
-# Configure application
-app = Flask(__name__)
 
-# Ensure templates are auto-reloaded
-app.config["TEMPLATES_AUTO_RELOAD"] = True
+def __getattr__(name):
+    """Create application.app on first access, so importing this module stays cheap."""
+    global _app
+    if name != "app":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _app_lock:
+        if _app is None:
+            _app = create_app()
+    return _app
 
-# Ensure responses aren't cached
 
+# Cache fingerprinted static files and quotes, revalidate pages by ETag and never store the rest
 
-@app.after_request
+
+@bp.after_app_request
 def after_request(response):
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Expires"] = 0
-    response.headers["Pragma"] = "no-cache"
+    cache_control = caching.policy(request.method, request.path, request.args, response.status_code, quote_cache.ttl)
+    if caching.set_headers(response, cache_control) and not response.is_streamed:
+
+        # Answer a repeated request for an unchanged page with 304 Not Modified
+        response.add_etag()
+        response.make_conditional(request)
     return response
 
 
-# Custom filter
-app.jinja_env.filters["usd"] = usd
+@bp.before_app_request
+def start_background():
+    """Start filling limit and stop orders and ranking portfolios once the application is serving."""
+    scheduler.start()
+    current_app.extensions["leaderboard"].start()
 
-# Configure session to use filesystem (instead of signed cookies)
-app.config["SESSION_FILE_DIR"] = mkdtemp()
-app.config["SESSION_PERMANENT"] = False
-app.config["SESSION_TYPE"] = "filesystem"
-Session(app)
 
-# Configure CS50 Library to use SQLite database
-db = SQL("sqlite:///finance.db")
+@bp.teardown_app_request
+def release_db(exception):
+    """Give request's database connection back to the pool."""
+    db.release()
 
 
-@app.route("/")
+@bp.route("/")
 @login_required
 def index():
     """Show portfolio of stocks"""
-    # Get data from buy table
-    buy_rows = db.execute("SELECT * FROM buy WHERE fkey = :user_id", user_id=session["user_id"])
-
-    # Initialise variables and array list
-    i = 0
-    share_value = 0
-    symbols = []
-    shares = []
-    prices = []
-    totals = []
-
-    # Loop through each row of the table and input to arrays
-    for row in buy_rows:
-        i = i + 1
-        symbol = row["symbol"]
-        share = row["share"]
-        quote = lookup(symbol)
-        if not quote == None:
-            price = quote["price"]
-            total = share * price
-            share_value = share_value + total
-            symbols.append(symbol)
-            shares.append(share)
-            prices.append(usd(price))
-            totals.append(usd(total))
-
-    # Get cash value from users table
-    cash = db.execute("SELECT cash FROM users WHERE id = :user_id", user_id=session["user_id"])
-    cash_cash = cash[0]["cash"]
-
-    # Calculate the total cash
-    overall = cash_cash + share_value
-
-    return render_template("index.html", i=i, symbols=symbols, shares=shares, prices=prices, totals=totals,
-                           total=usd(cash_cash), overall=usd(overall))
-
-
-@app.route("/buy", methods=["GET", "POST"])
+    positions, cash = portfolio.holdings(db, session["user_id"])
+
+    # Price every holding at once
+    quotes = lookup_many([row["symbol"] for row in positions])
+
+    return render_template("index.html", stream=current_app.extensions["streams"] is not None,
+                           **portfolio.value(positions, cash, quotes))
+
+
+@bp.route("/stream/portfolio")
+@login_required
+def stream_portfolio():
+    """Push portfolio valuations as Server-Sent Events whenever a held symbol's price changes"""
+
+    # Tell the browser to stop reconnecting (with 204) if streams are off or all in use
+    slots = current_app.extensions["streams"]
+    if slots is None or not slots.acquire(blocking=False):
+        return Response(status=204)
+    user_id = session["user_id"]
+    database = current_app.extensions["db"]
+
+    def events():
+        positions, cash = portfolio.holdings(database, user_id)
+        symbols = [row["symbol"] for row in positions]
+
+        # Don't hold a database connection for the life of the stream
+        database.release()
+        signal = poller.subscribe(symbols)
+        try:
+            while True:
+                try:
+                    signal.get(timeout=15)
+                except queue.Empty:
+
+                    # Keep the connection open through proxies
+                    yield ": keep-alive\n\n"
+                    continue
+
+                # Re-read holdings, which trades and filled orders may have changed since
+                positions, cash = portfolio.holdings(database, user_id)
+                database.release()
+                if [row["symbol"] for row in positions] != symbols:
+                    poller.resubscribe(signal, symbols, [row["symbol"] for row in positions])
+                    symbols = [row["symbol"] for row in positions]
+
+                # Price symbols the poller hasn't seen yet, e.g. just bought, through the quote cache
+                quotes = poller.quotes(symbols)
+                missing = [symbol for symbol in symbols if symbol.upper() not in quotes]
+                if missing:
+                    quotes.update(lookup_many(missing))
+                valuation = portfolio.value(positions, cash, quotes)
+                yield f"data: {json.dumps(valuation)}\n\n"
+        finally:
+            poller.unsubscribe(signal, symbols)
+
+    response = Response(events(), mimetype="text/event-stream", headers={"X-Accel-Buffering": "no"})
+    response.call_on_close(slots.release)
+    return response
+
+
+@bp.route("/buy", methods=["GET", "POST"])
 @login_required
 def buy():
     """Buy shares of stock"""
@@ -95,10 +230,6 @@ def buy():
         if not request.form.get("symbol"):
             return apology("missing symbol", 400)
 
-        # Ensure symbol was valid
-        elif lookup(request.form.get("symbol")) == None:
-            return apology("invalid symbol", 400)
-
         # Ensure share was submitted
         elif not request.form.get("shares"):
             return apology("missing share", 400)
@@ -112,62 +243,173 @@ def buy():
         if not int(request.form.get("shares")) >= 1:
             return apology("invalid share", 400)
 
-        # Get the now price of the symbol
+        # Get the now price of the symbol, ensuring symbol was valid
         quote = lookup(request.form.get("symbol"))
+        if quote == None:
+            return apology("invalid symbol", 400)
+
         new_share = int(request.form.get("shares"))
 
-        price = quote["price"]
-        buy_symbol = quote["symbol"]
+        # Pay for the shares and record the trade
+        try:
+            trades.buy(db, session["user_id"], quote["symbol"], new_share, quote["price"])
+        except trades.TradeError as e:
+            return apology(str(e), 400)
+
+        return redirect("/")
 
-        # Ensure sufficient cash to buy
-        user_cash = db.execute("SELECT cash FROM users WHERE id = :user_id", user_id=session["user_id"])
+    # User reached route via GET (as by clicking a link or via redirect)
+    else:
+        return render_template("buy.html")
 
-        cash = user_cash[0]["cash"]
 
-        if new_share * price > cash:
-            apology("can`t afford", 400)
-        else:
+@bp.route("/orders", methods=["GET", "POST"])
+@login_required
+def order_list():
+    """Place limit and stop orders and list recent ones"""
+    if request.method == "POST":
+        try:
+            orders.create(db, session["user_id"], request.form.get("side"), request.form.get("kind"),
+                          request.form.get("symbol"), request.form.get("shares"), request.form.get("price"))
+        except trades.TradeError as e:
+            return apology(str(e), 400)
+        return redirect("/orders")
 
-            # Check if the symbol is in the buy table
-            existing_symbols = db.execute("SELECT count(*) FROM buy WHERE fkey = :user_id and symbol = :symbol",
-                                          user_id=session["user_id"], symbol=buy_symbol)
+    rows = db.execute("SELECT id, symbol, side, kind, shares, price, status, created, fill_price, error FROM orders "
+                      "WHERE fkey = :user_id ORDER BY id DESC LIMIT :limit",
+                      user_id=session["user_id"], limit=HISTORY_PAGE_SIZE)
+    return render_template("orders.html", rows=rows)
 
-            # Insert new row if no exists
-            if existing_symbols[0]["count(*)"] == 0:
-                db.execute("INSERT INTO buy (fkey, symbol, share) VALUES (:nfkey, :nsymbol, :nshare)",
-                           nfkey=session["user_id"], nsymbol=quote["symbol"], nshare=new_share)
-            else:
 
-                # Update current row if exists
-                db.execute("UPDATE buy SET share = :vshare WHERE fkey = :user_id and symbol = :symbol",
-                           vshare=existing_symbols[0]["count(*)"] + new_share, user_id=session["user_id"],
-                           symbol=buy_symbol)
+@bp.route("/orders/<int:order_id>/cancel", methods=["POST"])
+@login_required
+def order_cancel(order_id):
+    """Cancel an open order"""
+    if not orders.cancel(db, session["user_id"], order_id):
+        return apology("order not open", 400)
+    scheduler.book.remove(order_id)
+    return redirect("/orders")
 
-            # Update cash
-            db.execute("UPDATE users SET cash = :new_cash WHERE id = :user_id",
-                       user_id=session["user_id"], new_cash=cash - new_share * price)
 
-            # Update history
-            db.execute("INSERT INTO history (fkey, symbol, price, share, time) VALUES (:nfkey, :nsymbol, :nprice, :nshare, :ntime)",
-                       nfkey=session["user_id"], nsymbol=quote["symbol"], nprice=usd(price), nshare=new_share, ntime=str(datetime.now())[:19])
+@bp.route("/orders/batch", methods=["GET", "POST"])
+@login_required
+def batch():
+    """Buy and sell several stocks at once, all or nothing"""
+    if request.method == "POST":
 
-            return redirect("/")
+        # Accept a JSON list of orders or rows of the batch form, skipping blank rows
+        data = request.get_json(silent=True)
+        if data is not None:
+            items = data.get("orders") if isinstance(data, dict) else None
+            if not isinstance(items, list) or not all(isinstance(order, dict) for order in items):
+                return jsonify(error="invalid orders"), 400
+            rows = [(order.get("side"), order.get("symbol"), order.get("shares")) for order in items]
+        else:
+            rows = [(side, symbol, shares) for side, symbol, shares in
+                    zip(request.form.getlist("side"), request.form.getlist("symbol"), request.form.getlist("shares"))
+                    if symbol or shares]
 
-    # User reached route via GET (as by clicking a link or via redirect)
+        try:
+            parsed = [trades.parse_order(side, symbol, shares) for side, symbol, shares in rows]
+            if not parsed:
+                raise trades.TradeError("missing orders")
+
+            # Price every symbol at once and fill the orders together
+            quotes = lookup_many([symbol for side, symbol, shares in parsed])
+            filled = trades.batch(db, session["user_id"], parsed, quotes)
+        except trades.TradeError as e:
+            if data is not None:
+                return jsonify(error=str(e)), 400
+            return apology(str(e), 400)
+
+        if data is not None:
+            return jsonify(filled=[dict(side=side, symbol=symbol, shares=shares, price=price)
+                                   for side, symbol, shares, price in filled])
+        return redirect("/")
     else:
-        return render_template("buy.html")
+        return render_template("batch.html")
+
+
+@bp.route("/performance")
+@login_required
+def performance():
+    """Show cost basis and profit and loss per stock"""
+    positions, cash = portfolio.holdings(db, session["user_id"])
 
+    # Price every holding at once
+    quotes = lookup_many([row["symbol"] for row in positions])
 
-@app.route("/history")
+    rows, totals = analytics.performance(db, session["user_id"], positions, quotes)
+    return render_template("performance.html", rows=rows, totals=totals)
+
+
+@bp.route("/leaderboard")
+@login_required
+def leaderboard():
+    """Show the most valuable portfolios and user's rank"""
+    rows, ranks = current_app.extensions["leaderboard"].get()
+    return render_template("leaderboard.html", rows=rows[:LEADERBOARD_SIZE], rank=ranks.get(session["user_id"]),
+                           users=len(rows))
+
+
+@bp.route("/admin")
+@login_required
+def admin():
+    """Show site-wide totals, symbols and daily volume to admins"""
+    username = db.execute("SELECT username FROM users WHERE id = :user_id", user_id=session["user_id"])[0]["username"]
+    if username not in ADMIN_USERNAMES:
+        return apology("forbidden", 403)
+    totals, symbols, daily = analytics.overview(db, lookup_many)
+    return render_template("admin.html", totals=totals, symbols=symbols, daily=daily)
+
+
+@bp.route("/chart/<symbol>")
+@login_required
+def chart(symbol):
+    """Serve symbol's recorded prices over the last ?days= as at most ?points= bars of JSON."""
+    try:
+        days = float(request.args.get("days", 1))
+        points = min(int(request.args.get("points", 200)), 1000)
+    except ValueError:
+        return jsonify(error="invalid range"), 400
+    if not days > 0 or not points >= 1:
+        return jsonify(error="invalid range"), 400
+    days = min(days, MAX_CHART_DAYS)
+
+    # Aggregate whatever was recorded in range into evenly sized bars
+    end = int(time.time()) + 1
+    start = end - int(days * 86400)
+    interval = max(1, -(-(end - start) // points))
+    return jsonify(symbol=symbol.upper(), interval=interval, **price_store().chart(symbol, start, end, interval))
+
+
+@bp.route("/portfolio/timeline")
+@login_required
+def portfolio_timeline():
+    """Serve user's daily cash, holdings and total value as JSON."""
+    return jsonify(portfolio.timeline(db, price_store(), session["user_id"]))
+
+
+@bp.route("/history")
 @login_required
 def history():
     """Show history of transactions"""
-    rows = db.execute("SELECT * FROM history WHERE fkey = :user_id", user_id=session["user_id"])
 
-    return render_template("history.html", rows=rows)
+    # Stream every transaction if asked to, newest first
+    if request.args.get("all"):
+        return stream_template("history.html", rows=history_rows(session["user_id"]), older=None)
+
+    # Otherwise show one page of transactions older than the cursor
+    before = request.args.get("before", type=int)
+    rows = history_page(session["user_id"], before, HISTORY_PAGE_SIZE)
+
+    # Link to the next page if this one is full
+    older = rows[-1]["id"] if len(rows) == HISTORY_PAGE_SIZE else None
+
+    return render_template("history.html", rows=rows, older=older)
 
 
-@app.route("/login", methods=["GET", "POST"])
+@bp.route("/login", methods=["GET", "POST"])
 def login():
     """Log user in"""
 
@@ -185,16 +427,14 @@ def login():
         elif not request.form.get("password"):
             return apology("must provide password", 403)
 
-        # Query database for username
-        rows = db.execute("SELECT * FROM users WHERE username = :username",
-                          username=request.form.get("username"))
-
         # Ensure username exists and password is correct
-        if len(rows) != 1 or not check_password_hash(rows[0]["hash"], request.form.get("password")):
-            return apology("invalid username and/or password", 403)
+        try:
+            user_id = authenticate(request.form.get("username"), request.form.get("password"))
+        except LoginError as e:
+            return apology(str(e), e.status)
 
         # Remember which user has logged in
-        session["user_id"] = rows[0]["id"]
+        session["user_id"] = user_id
 
         # Redirect user to home page
         return redirect("/")
@@ -204,7 +444,7 @@ def login():
         return render_template("login.html")
 
 
-@app.route("/logout")
+@bp.route("/logout")
 def logout():
     """Log user out"""
 
@@ -215,18 +455,18 @@ def logout():
     return redirect("/")
 
 
-@app.route("/quote", methods=["GET", "POST"])
+@bp.route("/quote", methods=["GET", "POST"])
 @login_required
 def quote():
     """Get stock quote."""
-    # User reached route via POST (as by submitting a symbol via POST)
-    if request.method == "POST":
+    # User reached route via GET with a symbol (as by submitting the form) or via POST
+    if request.method == "POST" or "symbol" in request.args:
 
         # Ensure symbol was submitted
-        if not request.form.get("symbol"):
+        if not request.values.get("symbol"):
             return apology("missing symbol", 400)
         else:
-            quote = lookup(request.form.get("symbol"))
+            quote = lookup(request.values.get("symbol"))
 
             # Ensure symbol was valid
             if quote == None:
@@ -239,7 +479,7 @@ def quote():
         return render_template("quote.html")
 
 
-@app.route("/register", methods=["GET", "POST"])
+@bp.route("/register", methods=["GET", "POST"])
 def register():
     """Register user"""
 
@@ -270,9 +510,15 @@ def register():
         if len(existing_rows) != 0:
             return apology("username taken", 400)
 
+        # Hash password in a worker process
+        try:
+            password = hasher.generate(request.form.get("password"))
+        except hashing.Busy:
+            return apology("try again later", 503)
+
         # Query database for username
         db.execute("INSERT INTO users (username, hash) VALUES (:username, :password)",
-                   username=request.form.get("username"), password=generate_password_hash(request.form.get("password")))
+                   username=request.form.get("username"), password=password)
 
         # Query database for username
         rows = db.execute("SELECT * FROM users WHERE username = :username",
@@ -288,7 +534,7 @@ def register():
     return render_template("register.html")
 
 
-@app.route("/sell", methods=["GET", "POST"])
+@bp.route("/sell", methods=["GET", "POST"])
 @login_required
 def sell():
     """Sell shares of stock"""
@@ -300,53 +546,39 @@ def sell():
         # Ensure valid share
         try:
             input_share = int(request.form.get("shares"))
-        except ValueError:
+        except (TypeError, ValueError):
             return apology("invalid share", 400)
 
-        # Check input share is no more than owned
-        owned_share = db.execute("SELECT share FROM buy WHERE fkey = :user_id AND symbol = :owned_symbols",
-                                 user_id=session["user_id"], owned_symbols=selected_symbol)
-
-        if input_share > owned_share[0]["share"]:
-            return apology("too many shares", 400)
+        if not input_share >= 1:
+            return apology("invalid share", 400)
 
         # Check for valid symbol
-        current_quote = lookup(selected_symbol)
-        if not current_quote == 0:
-            current_price = current_quote["price"]
-
-        # Get the number of share if it`s sold
-        current_share = owned_share[0]["share"] - input_share
-
-        # Delete if left share is 0 and update if not
-        if current_share == 0:
-            db.execute("DELETE FROM buy WHERE symbol = :symbol", symbol=selected_symbol)
-        else:
-            db.execute("UPDATE buy SET share = :share WHERE fkey = :user_id AND symbol = :symbol",
-                       share=current_share, user_id=session["user_id"], symbol=selected_symbol)
-
-        # Get cash from the database
-        user_cash = db.execute("SELECT cash FROM users WHERE id = :user_id", user_id=session["user_id"])
-        cash = user_cash[0]["cash"]
-
-        # Update cash
-        db.execute("UPDATE users SET cash = :new_cash WHERE id = :user_id",
-                   user_id=session["user_id"], new_cash=cash + input_share * current_price)
+        current_quote = lookup(selected_symbol or "")
+        if current_quote == None:
+            return apology("invalid symbol", 400)
 
-        # Update history
-        db.execute("INSERT INTO history (fkey, symbol, price, share, time) VALUES (:nfkey, :nsymbol, :nprice, :nshare, :ntime)",
-                   nfkey=session["user_id"], nsymbol=selected_symbol, nprice=usd(current_price), nshare=input_share * (-1), ntime=str(datetime.now())[:19])
+        # Sell the shares if owned and record the trade
+        try:
+            trades.sell(db, session["user_id"], current_quote["symbol"], input_share, current_quote["price"])
+        except trades.TradeError as e:
+            return apology(str(e), 400)
 
         return redirect("/")
     else:
         return render_template("sell.html", symbols=symbols)
 
 
+@bp.route("/symbols")
+@login_required
+def symbols():
+    """Suggest listed symbols starting with ?prefix= as JSON."""
+    prefix = request.args.get("prefix", "").strip()
+    if symbol_directory() is None or not prefix:
+        return jsonify([])
+    return jsonify([{"symbol": symbol, "name": name}
+                    for symbol, name in symbol_directory().search(prefix, limit=int(os.getenv("SYMBOLS_LIMIT", 10)))])
+
+
 def errorhandler(e):
     """Handle error"""
     return apology(e.name, e.code)
-
-
-# listen for errors
-for code in default_exceptions:
-    app.errorhandler(code)(errorhandler)
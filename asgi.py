@@ -0,0 +1,229 @@
+import asyncio
+import json
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import Request as FlaskRequest
+from functools import wraps
+from quart import Quart, g, make_response, redirect, render_template, request
+
+import application
+import caching
+import portfolio
+import trades
+from helpers import escape, lookup_async, lookup_many_async, quote_cache, usd
+from streams import AsyncSignal
+
+# Serve the quote-heavy routes from coroutines and everything else from the WSGI app, e.g.
+#   hypercorn asgi:app
+ASYNC_ROUTES = {"/", "/buy", "/quote", "/sell", "/stream/portfolio"}
+
+# Configure async application, sharing templates with the WSGI one
+async_app = Quart(__name__)
+async_app.jinja_env.filters["usd"] = usd
+async_app.jinja_env.globals["static_url"] = application.app.jinja_env.globals["static_url"]
+wsgi_app = WsgiToAsgi(application.app)
+
+# Share the WSGI application's database, which coroutines use from worker threads outside its context
+db = application.app.extensions["db"]
+
+
+@async_app.after_request
+async def after_request(response):
+    """Apply the WSGI application's cache policy."""
+    cache_control = caching.policy(request.method, request.path, request.args, response.status_code, quote_cache.ttl)
+    if caching.set_headers(response, cache_control) and response.mimetype != "text/event-stream":
+
+        # Answer a repeated request for an unchanged page with 304 Not Modified
+        await response.add_etag()
+        response = await response.make_conditional(request)
+    return response
+
+
+async def app(scope, receive, send):
+    """Dispatch ASGI requests between the async routes and the WSGI application."""
+    if scope["type"] == "lifespan" or scope.get("path") in ASYNC_ROUTES:
+        await async_app(scope, receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
+
+
+async def run_db(f, *args, **kwargs):
+    """Call f in a worker thread, giving its database connection back afterwards."""
+    def call():
+        try:
+            return f(*args, **kwargs)
+        finally:
+            db.release()
+    return await asyncio.to_thread(call)
+
+
+async def render(template, **context):
+    """Render template with the Flask session's user (and no flashes) visible to layout.html."""
+    return await render_template(template, session={"user_id": g.user_id}, get_flashed_messages=list, **context)
+
+
+async def apology(message, code=400):
+    """Render message as an apology to user."""
+    return await render("apology.html", top=code, bottom=escape(message)), code
+
+
+def read_session(cookie):
+    """Return the id of the user logged in by cookie, opening its session as the WSGI application would."""
+    session = application.app.session_interface.open_session(application.app, FlaskRequest({"HTTP_COOKIE": cookie}))
+    return session.get("user_id") if session is not None else None
+
+
+def login_required(f):
+    """Decorate async routes to require a login made through the WSGI application."""
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+
+        # Read the session through Flask so both applications share one session store
+        g.user_id = await run_db(read_session, request.headers.get("Cookie", ""))
+        if g.user_id is None:
+            return redirect("/login")
+        return await f(*args, **kwargs)
+    return decorated_function
+
+
+@async_app.route("/")
+@login_required
+async def index():
+    """Show portfolio of stocks"""
+    positions, cash = await run_db(portfolio.holdings, db, g.user_id)
+
+    # Price every holding at once
+    quotes = await lookup_many_async([row["symbol"] for row in positions])
+
+    return await render("index.html", stream=True, **portfolio.value(positions, cash, quotes))
+
+
+@async_app.route("/stream/portfolio")
+@login_required
+async def stream_portfolio():
+    """Push portfolio valuations as Server-Sent Events whenever a held symbol's price changes"""
+    user_id = g.user_id
+
+    async def events():
+        positions, cash = await run_db(portfolio.holdings, db, user_id)
+        symbols = [row["symbol"] for row in positions]
+        signal = application.poller.subscribe(symbols, AsyncSignal())
+        try:
+            while True:
+                try:
+                    await signal.get(timeout=15)
+                except asyncio.TimeoutError:
+
+                    # Keep the connection open through proxies
+                    yield b": keep-alive\n\n"
+                    continue
+
+                # Re-read holdings, which trades and filled orders may have changed since
+                positions, cash = await run_db(portfolio.holdings, db, user_id)
+                if [row["symbol"] for row in positions] != symbols:
+                    application.poller.resubscribe(signal, symbols, [row["symbol"] for row in positions])
+                    symbols = [row["symbol"] for row in positions]
+
+                # Price symbols the poller hasn't seen yet, e.g. just bought, through the quote cache
+                quotes = application.poller.quotes(symbols)
+                missing = [symbol for symbol in symbols if symbol.upper() not in quotes]
+                if missing:
+                    quotes.update(await lookup_many_async(missing))
+                valuation = portfolio.value(positions, cash, quotes)
+                yield f"data: {json.dumps(valuation)}\n\n".encode()
+        finally:
+            application.poller.unsubscribe(signal, symbols)
+
+    # Stream for as long as the browser stays, rather than Quart's default response timeout
+    response = await make_response(events(), {"Content-Type": "text/event-stream", "X-Accel-Buffering": "no"})
+    response.timeout = None
+    return response
+
+
+@async_app.route("/buy", methods=["GET", "POST"])
+@login_required
+async def buy():
+    """Buy shares of stock"""
+    if request.method == "POST":
+        form = await request.form
+
+        # Ensure symbol and share were submitted
+        if not form.get("symbol"):
+            return await apology("missing symbol", 400)
+        elif not form.get("shares"):
+            return await apology("missing share", 400)
+
+        # Ensure share was valid
+        try:
+            new_share = int(form.get("shares"))
+        except ValueError:
+            return await apology("invalid share", 400)
+        if not new_share >= 1:
+            return await apology("invalid share", 400)
+
+        # Get the now price of the symbol, ensuring symbol was valid
+        quote = await lookup_async(form.get("symbol"))
+        if quote == None:
+            return await apology("invalid symbol", 400)
+
+        # Pay for the shares and record the trade
+        try:
+            await run_db(trades.buy, db, g.user_id, quote["symbol"], new_share, quote["price"])
+        except trades.TradeError as e:
+            return await apology(str(e), 400)
+
+        return redirect("/")
+    else:
+        return await render("buy.html")
+
+
+@async_app.route("/quote", methods=["GET", "POST"])
+@login_required
+async def quote():
+    """Get stock quote."""
+    if request.method == "POST" or "symbol" in request.args:
+        form = await request.values
+
+        # Ensure symbol was submitted
+        if not form.get("symbol"):
+            return await apology("missing symbol", 400)
+
+        # Ensure symbol was valid
+        quote = await lookup_async(form.get("symbol"))
+        if quote == None:
+            return await apology("invalid symbol", 400)
+        return await render("quoted.html", symbol=quote["symbol"], price=usd(quote["price"]))
+    else:
+        return await render("quote.html")
+
+
+@async_app.route("/sell", methods=["GET", "POST"])
+@login_required
+async def sell():
+    """Sell shares of stock"""
+    if request.method == "POST":
+        form = await request.form
+
+        # Ensure valid share
+        try:
+            input_share = int(form.get("shares"))
+        except (TypeError, ValueError):
+            return await apology("invalid share", 400)
+        if not input_share >= 1:
+            return await apology("invalid share", 400)
+
+        # Check for valid symbol
+        current_quote = await lookup_async(form.get("symbol") or "")
+        if current_quote == None:
+            return await apology("invalid symbol", 400)
+
+        # Sell the shares if owned and record the trade
+        try:
+            await run_db(trades.sell, db, g.user_id, current_quote["symbol"], input_share, current_quote["price"])
+        except trades.TradeError as e:
+            return await apology(str(e), 400)
+
+        return redirect("/")
+    else:
+        symbols = await run_db(db.execute, "SELECT DISTINCT symbol FROM buy WHERE fkey = :user_id", user_id=g.user_id)
+        return await render("sell.html", symbols=symbols)
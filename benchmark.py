@@ -0,0 +1,250 @@
+import argparse
+import http.cookiejar
+import json
+import logging
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+# Share of requests going to each route
+MIX = [("index", 40), ("quote", 20), ("buy", 15), ("sell", 15), ("history", 10)]
+
+
+def main():
+    """Load-test the app against a throwaway database and offline quotes, printing latencies as JSON."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--users", type=int, default=20, help="users to seed")
+    parser.add_argument("--holdings", type=int, default=10, help="holdings per user")
+    parser.add_argument("--history", type=int, default=500, help="history rows per user")
+    parser.add_argument("--symbols", type=int, default=100, help="distinct symbols quoted")
+    parser.add_argument("--requests", type=int, default=2000, help="requests to send in total")
+    parser.add_argument("--concurrency", type=int, default=8, help="clients sending requests at once")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds each quote takes upstream")
+    parser.add_argument("--ttl", type=float, default=60, help="seconds quotes are cached")
+    parser.add_argument("--seed", type=int, default=50, help="seed for random choices")
+    parser.add_argument("--startup", type=int, default=0, help="time this many cold starts instead of load-testing")
+    parser.add_argument("--budget", type=float, help="milliseconds a median cold start may take, else exit with 1")
+    parser.add_argument("--output", help="file to write results to instead of stdout")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    # Work on a copy of finance.db, with a price for every symbol
+    directory = tempfile.mkdtemp()
+    try:
+        shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), "finance.db"), directory)
+        symbols = [f"SYM{i:04d}" for i in range(args.symbols)]
+        with open(os.path.join(directory, "prices.csv"), "w") as file:
+            for symbol in symbols:
+                file.write(f"{symbol},{random.uniform(5, 500):.2f}\n")
+
+        os.environ.update(DATABASE=os.path.join(directory, "finance.db"),
+                          QUOTE_PROVIDER="local",
+                          QUOTE_FILE=os.path.join(directory, "prices.csv"),
+                          QUOTE_LATENCY=str(args.latency),
+                          QUOTE_TTL=str(args.ttl),
+                          PRICE_STORE=os.path.join(directory, "prices"),
+                          LOGIN_ATTEMPTS_PER_ADDRESS=str(args.concurrency))
+        results = startup(args) if args.startup else run(args, symbols)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+    # Fail if cold starts are over budget, e.g. in CI
+    if args.startup and args.budget is not None and results["phases"]["total"]["p50_ms"] > args.budget:
+        return 1
+
+
+def run(args, symbols):
+    """Seed users, serve the app and drive it with concurrent clients."""
+    from werkzeug.serving import make_server
+
+    import application
+
+    db = application.app.extensions["db"]
+    users = seed(db, args, symbols)
+    db.release()
+
+    # Serve quietly so logging doesn't skew timings
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, application.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    # Each client logs in as its own user, then sends its share of requests
+    timings = {route: [] for route, weight in MIX}
+    errors = {route: 0 for route, weight in MIX}
+    lock = threading.Lock()
+
+    # Log every client in before timing anything, failing the run if any login doesn't succeed
+    openers = [login(base, users[number % len(users)][0]) for number in range(args.concurrency)]
+
+    def client(number):
+        username, holdings = users[number % len(users)]
+        opener = openers[number]
+        rng = random.Random(args.seed + number)
+        for _ in range(args.requests // args.concurrency):
+            route = rng.choices([route for route, weight in MIX], [weight for route, weight in MIX])[0]
+            start = time.perf_counter()
+            ok = send(opener, base, route, rng.choice(holdings))
+            elapsed = time.perf_counter() - start
+            with lock:
+                timings[route].append(elapsed)
+                errors[route] += not ok
+
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client, args=(number,)) for number in range(args.concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    everything = [seconds for route in timings for seconds in timings[route]]
+    return {
+        "commit": commit(),
+        "config": vars(args),
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(everything) / elapsed, 1),
+        "overall": summarize(everything, sum(errors.values())),
+        "routes": {route: summarize(timings[route], errors[route]) for route in timings},
+    }
+
+
+# Run in a fresh interpreter, printing how long each phase of starting the app took
+COLD_START = """
+import json, time
+start = time.perf_counter()
+import application
+imported = time.perf_counter()
+app = application.create_app()
+created = time.perf_counter()
+app.test_client().get("/login")
+served = time.perf_counter()
+print(json.dumps({"import": imported - start, "create": created - imported,
+                  "first_request": served - created, "total": served - start}))
+"""
+
+
+def startup(args):
+    """Start the app in fresh interpreters, returning how long importing, creating and first serving it took."""
+    phases = {}
+    for _ in range(args.startup):
+        result = subprocess.run([sys.executable, "-c", COLD_START], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        for phase, seconds in json.loads(result.stdout.splitlines()[-1]).items():
+            phases.setdefault(phase, []).append(seconds)
+    return {
+        "commit": commit(),
+        "config": vars(args),
+        "phases": {phase: summarize(seconds, 0) for phase, seconds in phases.items()},
+    }
+
+
+def seed(db, args, symbols):
+    """Add users with holdings and history, returning their usernames and held symbols."""
+    from werkzeug.security import generate_password_hash
+
+    # Hash the shared password once, as hashing is deliberately slow
+    password = generate_password_hash("benchmark")
+    now = int(time.time())
+    users = []
+    with db.transaction():
+        for number in range(args.users):
+            username = f"benchmark{number}"
+            user_id = db.execute("INSERT INTO users (username, hash, cash) VALUES (:username, :hash, :cash)",
+                                 username=username, hash=password, cash=1000000)
+            holdings = random.sample(symbols, min(args.holdings, len(symbols)))
+            for symbol in holdings:
+                db.execute("INSERT INTO buy (fkey, symbol, share, cost) VALUES (:user_id, :symbol, 100000, 1000000)",
+                           user_id=user_id, symbol=symbol)
+            for row in range(args.history):
+                db.execute("INSERT INTO history (fkey, symbol, price, share, time) VALUES (:user_id, :symbol, 1000, 1, :time)",
+                           user_id=user_id, symbol=random.choice(holdings or symbols), time=now - row * 60)
+            users.append((username, holdings or symbols))
+    return users
+
+
+def login(base, username):
+    """Return a URL opener logged in as username that doesn't follow redirects."""
+    class NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect)
+    if not send(opener, base, "login", username):
+        raise RuntimeError(f"couldn't log in as {username}")
+    return opener
+
+
+def send(opener, base, route, argument):
+    """Send one request for route, returning whether it succeeded."""
+
+    # Path, form and where a successful request redirects to, if anywhere
+    requests = {
+        "index": ("/", None, None),
+        "quote": ("/quote", {"symbol": argument}, None),
+        "buy": ("/buy", {"symbol": argument, "shares": 1}, "/"),
+        "sell": ("/sell", {"symbol": argument, "shares": 1}, "/"),
+        "history": ("/history", None, None),
+        "login": ("/login", {"username": argument, "password": "benchmark"}, "/"),
+    }
+    path, form, target = requests[route]
+    data = urllib.parse.urlencode(form).encode() if form is not None else None
+    try:
+        with opener.open(base + path, data) as response:
+            response.read()
+            return response.status == 200 and target is None
+    except urllib.error.HTTPError as e:
+
+        # A redirect anywhere else, e.g. to /login, means the request didn't do its job
+        location = urllib.parse.urlsplit(e.headers.get("Location", "")).path
+        return e.code in (301, 302, 303) and target is not None and location == target
+    except OSError:
+        return False
+
+
+def commit():
+    """Return the checked out git commit, so results can be compared between commits."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def summarize(seconds, errors):
+    """Return count, errors and latency percentiles in milliseconds."""
+    if not seconds:
+        return {"count": 0, "errors": errors}
+    seconds = sorted(seconds)
+
+    def percentile(p):
+        return round(seconds[min(len(seconds) - 1, int(p / 100 * len(seconds)))] * 1000, 2)
+
+    return {
+        "count": len(seconds),
+        "errors": errors,
+        "mean_ms": round(sum(seconds) / len(seconds) * 1000, 2),
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+    }
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+
+# Upstream failures are logged rather than raised, as a stale quote or none at all is still served
+log = logging.getLogger(__name__)
+
+
+class QuoteCache:
+    """Process-wide LRU cache of quotes keyed by uppercased symbol."""
+
+    def __init__(self, fetch, ttl=60, maxsize=1024, negative_ttl=300, stale=0, fetch_async=None):
+        """
+        Wrap fetch(symbol), which returns a quote dict or None for an invalid symbol.
+
+        fetch_async, if given, is a coroutine function doing the same for get_async().
+
+        Quotes live for ttl seconds and invalid symbols for negative_ttl seconds.
+        For stale seconds past expiry the last quote is still served while a
+        single background refresh runs.
+        """
+        self.fetch = fetch
+        self.fetch_async = fetch_async
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.negative_ttl = negative_ttl
+        self.stale = stale
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def get(self, symbol):
+        """Return cached quote for symbol, fetching it if missing or expired."""
+        symbol = symbol.upper()
+        with self._lock:
+            found, quote = self._cached(symbol)
+            if found:
+                return quote
+
+            # Wait for a fetch of the same symbol that is already running
+            event = self._inflight.get(symbol)
+            if event is None:
+                self._inflight[symbol] = threading.Event()
+
+        if event is not None:
+            event.wait()
+            with self._lock:
+                entry = self._entries.get(symbol)
+            return entry[0] if entry is not None else None
+
+        return self._refresh(symbol)
+
+    async def get_async(self, symbol):
+        """Like get(), but awaits fetch_async instead of blocking on a miss."""
+        if self.fetch_async is None:
+            return await asyncio.to_thread(self.get, symbol)
+
+        symbol = symbol.upper()
+        with self._lock:
+            found, quote = self._cached(symbol)
+            if found:
+                return quote
+
+        # Share one fetch between coroutines missing the same symbol
+        task = self._tasks.get(symbol)
+        if task is None:
+            task = asyncio.ensure_future(self._refresh_async(symbol))
+            self._tasks[symbol] = task
+            task.add_done_callback(lambda task: self._tasks.pop(symbol, None))
+        return await asyncio.shield(task)
+
+    def peek(self, symbol):
+        """Return cached quote for symbol without fetching, or None."""
+        with self._lock:
+            entry = self._entries.get(symbol.upper())
+        return entry[0] if entry is not None else None
+
+    def put(self, symbol, quote):
+        """Store quote (or None for an invalid symbol) for symbol."""
+        ttl = self.ttl if quote is not None else self.negative_ttl
+        with self._lock:
+            self._entries[symbol.upper()] = (quote, time.monotonic() + ttl)
+            self._entries.move_to_end(symbol.upper())
+
+            # Evict least recently used quotes
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Forget every cached quote."""
+        with self._lock:
+            self._entries.clear()
+
+    def _cached(self, symbol):
+        """
+        Return (True, quote) if symbol can be answered from cache, else (False, None).
+
+        Starts a background refresh of a stale quote. Call with lock held.
+        """
+        entry = self._entries.get(symbol)
+        if entry is not None:
+            quote, expires = entry
+            self._entries.move_to_end(symbol)
+            now = time.monotonic()
+
+            # Fresh quote (or fresh knowledge that symbol is invalid)
+            if now < expires:
+                self.hits += 1
+                return True, quote
+
+            # Stale quote within grace period, refresh once in background
+            if quote is not None and now < expires + self.stale:
+                self.hits += 1
+                if symbol not in self._inflight:
+                    self._inflight[symbol] = threading.Event()
+                    threading.Thread(target=self._refresh, args=(symbol,), daemon=True).start()
+                return True, quote
+        self.misses += 1
+        return False, None
+
+    async def _refresh_async(self, symbol):
+        """Fetch symbol upstream without blocking and store it."""
+        try:
+            quote = await self.fetch_async(symbol)
+        except Exception:
+            log.exception("Failed to fetch %s", symbol)
+            return self.peek(symbol)
+        self.put(symbol, quote)
+        return quote
+
+    def _refresh(self, symbol):
+        """Fetch symbol upstream, store it and wake up any waiting threads."""
+        try:
+            quote = self.fetch(symbol)
+        except Exception:
+
+            # Keep serving what we had if upstream failed, but don't cache the failure
+            log.exception("Failed to fetch %s", symbol)
+            return self.peek(symbol)
+        else:
+            self.put(symbol, quote)
+            return quote
+        finally:
+            with self._lock:
+                event = self._inflight.pop(symbol, None)
+            if event is not None:
+                event.set()
@@ -0,0 +1,54 @@
+import functools
+import hashlib
+import os
+
+# Static files whose URL names their content can be reused for a year
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# Anything that changes state or sets credentials
+NO_STORE = "no-cache, no-store, must-revalidate"
+
+
+def policy(method, path, args, status, quote_ttl=60):
+    """
+    Return the Cache-Control header for a response to method path?args with status.
+
+    Fingerprinted static files are immutable; quotes may be reused for as long
+    as the quote cache would; other pages are private and revalidated by ETag.
+    """
+    if path.startswith("/static/"):
+        return IMMUTABLE if args.get("v") and status == 200 else "no-cache"
+    if method not in ("GET", "HEAD") or status != 200 or path in ("/login", "/logout", "/register"):
+        return NO_STORE
+    if path == "/quote" and args.get("symbol"):
+        return f"private, max-age={int(quote_ttl)}"
+    return "private, no-cache"
+
+
+def static_url(folder, filename):
+    """Return filename's URL under /static/, fingerprinted with its content."""
+    path = os.path.join(folder, filename)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return "/static/" + filename
+    return f"/static/{filename}?v={fingerprint(path, mtime)}"
+
+
+@functools.lru_cache(maxsize=256)
+def fingerprint(path, mtime):
+    """Return a short hash of path's content as of mtime."""
+    with open(path, "rb") as file:
+        return hashlib.md5(file.read()).hexdigest()[:12]
+
+
+def set_headers(response, cache_control):
+    """Set cache headers on response, returning whether it's private and should carry an ETag."""
+    response.headers["Cache-Control"] = cache_control
+    if cache_control == NO_STORE:
+        response.headers["Expires"] = 0
+        response.headers["Pragma"] = "no-cache"
+    elif cache_control.startswith("private"):
+        response.vary.add("Cookie")
+        return True
+    return False
@@ -0,0 +1,52 @@
+import os
+
+
+class Config:
+    """Settings shared by every profile."""
+
+    # SQLite database, with connections pooled per process
+    DATABASE = os.getenv("DATABASE", "finance.db")
+    DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", 8))
+
+    # Werkzeug method passwords are hashed with, by HASH_WORKERS processes queueing at most HASH_QUEUE more
+    PASSWORD_METHOD = os.getenv("PASSWORD_METHOD", "scrypt:32768:8:1")
+    HASH_WORKERS = int(os.getenv("HASH_WORKERS", 2))
+    HASH_QUEUE = int(os.getenv("HASH_QUEUE", 32))
+
+    # Seconds between checks of limit and stop orders against prices, once per quote TTL by default
+    ORDER_INTERVAL = float(os.getenv("ORDER_INTERVAL", os.getenv("QUOTE_TTL", 60)))
+
+    # Keep sessions in files, sqlite (shared by workers, for SESSION_LIFETIME seconds) or cookies signed with SECRET_KEY
+    SESSION_BACKEND = os.getenv("SESSION_BACKEND", "filesystem")
+    SESSION_LIFETIME = int(os.getenv("SESSION_LIFETIME", 86400))
+    SECRET_KEY = os.getenv("SECRET_KEY")
+
+    # Seconds an API token is valid for, 30 days by default
+    TOKEN_LIFETIME = int(os.getenv("TOKEN_LIFETIME", 2592000))
+
+    # Memoize apologies per message, code and login
+    APOLOGY_CACHE = False
+
+    # Compile every template at startup, keeping their bytecode on disk for other workers
+    PRECOMPILE_TEMPLATES = False
+
+    # Stat template files on every render, picking up edits
+    TEMPLATES_AUTO_RELOAD = True
+
+    # Most portfolio streams the WSGI app serves at once, each holding a worker thread (asgi.py's cost none)
+    STREAM_LIMIT = int(os.getenv("STREAM_LIMIT", 0))
+
+
+class Development(Config):
+    """Reload templates as they're edited."""
+
+
+class Production(Config):
+    """Compile templates once and cache what doesn't change."""
+    APOLOGY_CACHE = True
+    PRECOMPILE_TEMPLATES = True
+    TEMPLATES_AUTO_RELOAD = False
+
+
+# Profiles selectable with APP_CONFIG
+profiles = {"development": Development, "production": Production}
@@ -0,0 +1,121 @@
+import queue
+import sqlite3
+import threading
+import time
+
+from contextlib import contextmanager
+
+
+class Database:
+    """
+    Pool of SQLite connections with the same execute() API as cs50.SQL.
+
+    Each thread borrows its own connection on first use and gives it back with
+    release(). Connections use WAL so readers don't wait behind trades.
+    """
+
+    def __init__(self, path, pool_size=8, busy_timeout=5, mmap_size=64 * 1024 * 1024, cached_statements=256):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+
+        # Called with the seconds each statement took, if set
+        self.observe = None
+
+        # Called with the database before it's first used (e.g. to migrate it), if set
+        self.setup = None
+        self._setup_lock = threading.Lock()
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+        self._local = threading.local()
+
+    def connection(self):
+        """Return this thread's connection, borrowing one from the pool if needed."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            self._local.conn = conn
+
+            # Set up the database once, making other threads wait for it
+            if self.setup is not None:
+                self._prepare()
+        return conn
+
+    def release(self):
+        """Give this thread's connection back to the pool."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        del self._local.conn
+
+        # Never hand on a connection in the middle of a transaction
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def execute(self, sql, **params):
+        """
+        Execute sql with named parameters.
+
+        Like cs50.SQL, returns a list of dict rows for a query, the new row's id
+        for an INSERT, the number of rows changed for an UPDATE or DELETE, and
+        True otherwise.
+        """
+        start = time.perf_counter()
+        try:
+            cursor = self.connection().execute(sql, params)
+            if cursor.description is not None:
+                columns = [column[0] for column in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+            command = sql.lstrip().split(None, 1)[0].upper()
+            if command in ("INSERT", "REPLACE"):
+                return cursor.lastrowid
+            elif command in ("UPDATE", "DELETE"):
+                return cursor.rowcount
+            return True
+        finally:
+            if self.observe is not None:
+                self.observe(time.perf_counter() - start)
+
+    @contextmanager
+    def transaction(self):
+        """Run block as one BEGIN IMMEDIATE transaction, joining one already open."""
+        conn = self.connection()
+        if conn.in_transaction:
+            yield self
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _connect(self):
+        """Open and tune a new connection."""
+
+        # Manage transactions explicitly rather than through the sqlite3 module
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                               check_same_thread=False, cached_statements=self.cached_statements)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def _prepare(self):
+        """Run setup once, before any thread (other than the one running it) uses the database."""
+        with self._setup_lock:
+            if self.setup is not None:
+                self.setup(self)
+                self.setup = None
@@ -0,0 +1,113 @@
+import multiprocessing
+import threading
+import time
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class Busy(Exception):
+    """Raised when too many hashes are already queued, or the pool can't hash in time."""
+
+
+class HashingService:
+    """
+    Hash and check passwords in a bounded pool of processes, so bursts of
+    logins use spare cores instead of starving request threads.
+    """
+
+    def __init__(self, method="scrypt:32768:8:1", workers=2, max_queue=32, timeout=30):
+        """Hash with werkzeug method, queueing at most max_queue hashes beyond what workers are running."""
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def check(self, pwhash, password):
+        """Return whether password matches pwhash, raising Busy if the queue is full."""
+        return self._run(check_password_hash, pwhash, password)
+
+    def generate(self, password):
+        """Return a hash of password using the configured method, raising Busy if the queue is full."""
+        return self._run(generate_password_hash, password, self.method)
+
+    def needs_rehash(self, pwhash):
+        """Return whether pwhash was made with other parameters than the configured ones."""
+        return pwhash.split("$", 1)[0] != self.method
+
+    def _run(self, f, *args):
+        """Run f(*args) in the pool, or inline if there are no workers."""
+        if not self.workers:
+            return f(*args)
+        if not self._slots.acquire(blocking=False):
+            raise Busy()
+        pool = self._executor()
+        try:
+            future = pool.submit(f, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._discard(pool)
+            raise Busy()
+        except BaseException:
+            self._slots.release()
+            raise
+
+        # Hold the slot until the hash is done, even if we stop waiting for it, so the queue stays bounded
+        future.add_done_callback(lambda future: self._slots.release())
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            raise Busy()
+        except BrokenProcessPool:
+            self._discard(pool)
+            raise Busy()
+
+    def _executor(self):
+        """Start the pool on first use, spawning rather than forking a threaded server."""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _discard(self, pool):
+        """Drop a broken pool, e.g. after a worker was killed, so the next hash starts a new one."""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+
+class Throttle:
+    """Allow at most limit attempts per key within window seconds."""
+
+    def __init__(self, limit, window=60):
+        self.limit = limit
+        self.window = window
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        """Count an attempt for key, returning whether it's within the limit."""
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._attempts.setdefault(key, deque())
+            while attempts and attempts[0] <= now - self.window:
+                attempts.popleft()
+            if len(attempts) >= self.limit:
+                return False
+            attempts.append(now)
+
+            # Forget keys with no recent attempts now and then
+            if len(self._attempts) > 10000:
+                self._attempts = {key: attempts for key, attempts in self._attempts.items()
+                                  if attempts and attempts[-1] > now - self.window}
+            return True
+
+    def reset(self, key):
+        """Forget key's attempts, e.g. after a successful login."""
+        with self._lock:
+            self._attempts.pop(key, None)
@@ -1,26 +1,56 @@
-import csv
+import asyncio
 import os
-import urllib.request
+import time
 
-from flask import redirect, render_template, request, session
-from functools import wraps
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+
+from flask import current_app, redirect, render_template, request, session
+from functools import cache, lru_cache, wraps
+from jinja2 import FileSystemBytecodeCache
+
+import metrics
+from cache import QuoteCache
+from providers import provider_from_env
+from symbols import SymbolDirectory
 
 
 def apology(message, code=400):
     """Render message as an apology to user."""
-    def escape(s):
-        """
-        Escape special characters.
-
-        https://github.com/jacebrowning/memegen#special-characters
-        """
-        for old, new in [("-", "--"), (" ", "-"), ("_", "__"), ("?", "~q"),
-                         ("%", "~p"), ("#", "~h"), ("/", "~s"), ("\"", "''")]:
-            s = s.replace(old, new)
-        return s
+
+    # Reuse the page for this message unless there are flashes to show on it
+    if current_app.config.get("APOLOGY_CACHE") and "_flashes" not in session:
+        return rendered_apology(message, code, session.get("user_id") is not None), code
     return render_template("apology.html", top=code, bottom=escape(message)), code
 
 
+@lru_cache(maxsize=256)
+def rendered_apology(message, code, logged_in):
+    """Render an apology once per message, code and whether the user is logged in."""
+    return render_template("apology.html", top=code, bottom=escape(message))
+
+
+# Special characters and their escapes, replaced in one pass
+ESCAPES = str.maketrans({"-": "--", " ": "-", "_": "__", "?": "~q",
+                         "%": "~p", "#": "~h", "/": "~s", "\"": "''"})
+
+
+def escape(s):
+    """
+    Escape special characters.
+
+    https://github.com/jacebrowning/memegen#special-characters
+    """
+    return s.translate(ESCAPES)
+
+
+def precompile_templates(app):
+    """Compile all of app's templates, caching their bytecode on disk."""
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+
 def login_required(f):
     """
     Decorate routes to require login.
@@ -38,6 +68,13 @@ def login_required(f):
 def lookup(symbol):
     """Look up quote for symbol."""
 
+    with metrics.timer("quote"):
+        return cached_lookup(symbol)
+
+
+def cached_lookup(symbol):
+    """Look up quote for symbol through the quote cache."""
+
     # Reject symbol if it starts with caret
     if symbol.startswith("^"):
         return None
@@ -46,39 +83,140 @@ def lookup(symbol):
     if "," in symbol:
         return None
 
-    # Query Alpha Vantage for quote
-    # https://www.alphavantage.co/documentation/
+    # Reject symbol without asking upstream if it isn't listed
+    if symbol_directory() is not None and symbol not in symbol_directory():
+        return None
+
+    return quote_cache.get(symbol)
+
+
+async def lookup_async(symbol):
+    """Look up quote for symbol without blocking the event loop."""
+
+    # Reject symbol if it starts with caret or contains comma
+    if symbol.startswith("^") or "," in symbol:
+        return None
+
+    # Reject symbol without asking upstream if it isn't listed
+    if symbol_directory() is not None and symbol not in symbol_directory():
+        return None
+
+    start = time.perf_counter()
     try:
+        return await quote_cache.get_async(symbol)
+    finally:
+        metrics.observe("quote", time.perf_counter() - start)
+
+
+async def lookup_many_async(symbols, timeout=None):
+    """Like lookup_many(), but as concurrent coroutines rather than threads."""
+    if timeout is None:
+        timeout = float(os.getenv("QUOTE_DEADLINE", 5))
+
+    # Fetch each distinct symbol once
+    tasks = {}
+    for symbol in symbols:
+        if symbol.upper() not in tasks:
+            tasks[symbol.upper()] = asyncio.ensure_future(lookup_async(symbol))
+    if not tasks:
+        return {}
+
+    # Keep whatever finished before the deadline
+    done, not_done = await asyncio.wait(tasks.values(), timeout=timeout)
+    for task in not_done:
+        task.cancel()
+    quotes = {}
+    for symbol, task in tasks.items():
+        if task in done and task.result() is not None:
+            quotes[symbol] = task.result()
+    return quotes
+
+
+def lookup_many(symbols, timeout=None):
+    """
+    Look up quotes for many symbols concurrently.
 
-        # GET CSV
-        url = f"https://www.alphavantage.co/query?apikey={os.getenv('API_KEY')}&datatype=csv&function=TIME_SERIES_INTRADAY&interval=1min&symbol={symbol}"
-        webpage = urllib.request.urlopen(url)
+    Returns a dict of uppercased symbol to quote, leaving out symbols that are
+    invalid or whose quote did not arrive within timeout seconds.
+    """
+    if timeout is None:
+        timeout = float(os.getenv("QUOTE_DEADLINE", 5))
 
-        # Parse CSV
-        datareader = csv.reader(webpage.read().decode("utf-8").splitlines())
+    # Fetch each distinct symbol once
+    futures = {}
+    for symbol in symbols:
+        if symbol.upper() not in futures:
+            futures[symbol.upper()] = quote_pool.submit(cached_lookup, symbol)
 
-        # Ignore first row
-        next(datareader)
+    # Keep whatever finished before the deadline
+    with metrics.timer("quote"):
+        done, not_done = wait(futures.values(), timeout=timeout)
+    quotes = {}
+    for symbol, future in futures.items():
+        if future in done and future.result() is not None:
+            quotes[symbol] = future.result()
+    return quotes
 
-        # Parse second row
-        row = next(datareader)
 
-        # Ensure stock exists
-        try:
-            price = float(row[4])
-        except:
-            return None
+@cache
+def quote_provider():
+    """Return the provider named by QUOTE_PROVIDER, built on first use."""
+    return provider_from_env()
 
-        # Return stock's name (as a str), price (as a float), and (uppercased) symbol (as a str)
-        return {
-            "price": price,
-            "symbol": symbol.upper()
-        }
 
-    except:
-        return None
+@cache
+def price_store():
+    """Return the store keeping every quote fetched upstream, for charts, opened on first use."""
+
+    # Import numpy only once prices are needed, as it's slow to import
+    from prices import PriceStore
+    return PriceStore(os.getenv("PRICE_STORE", "prices"))
+
+
+@cache
+def symbol_directory():
+    """Return the directory of symbols listed in SYMBOLS_FILE, loaded on first use, or None."""
+    return SymbolDirectory(os.getenv("SYMBOLS_FILE")) if os.getenv("SYMBOLS_FILE") else None
+
+
+def fetch(symbol):
+    """Fetch quote for symbol upstream, keeping it in the price store."""
+    return price_store().observe(quote_provider().quote(symbol))
+
+
+async def fetch_async(symbol):
+    """Like fetch(), but as a coroutine."""
+    return price_store().observe(await quote_provider().quote_async(symbol))
+
+
+# Share quotes between requests so each symbol is fetched about once per TTL
+quote_cache = QuoteCache(metrics.timed("fetch", fetch),
+                         ttl=float(os.getenv("QUOTE_TTL", 60)),
+                         maxsize=int(os.getenv("QUOTE_CACHE_SIZE", 1024)),
+                         negative_ttl=float(os.getenv("QUOTE_NEGATIVE_TTL", 300)),
+                         stale=float(os.getenv("QUOTE_STALE_WHILE_REVALIDATE", 0)),
+                         fetch_async=fetch_async)
+
+# Bound how many quotes are fetched at once across all requests
+quote_pool = ThreadPoolExecutor(max_workers=int(os.getenv("QUOTE_WORKERS", 16)),
+                                thread_name_prefix="quote")
 
 
 def usd(value):
     """Format value as USD."""
     return f"${value:,.2f}"
+
+
+def cents(value):
+    """Convert dollars to integer cents, as prices are stored."""
+    return int(round(value * 100))
+
+
+def from_cents(value):
+    """Format integer cents as USD."""
+    return usd(value / 100)
+
+
+def timestamp(value):
+    """Format epoch seconds as local date and time."""
+    return datetime.fromtimestamp(value).strftime("%Y-%m-%d %H:%M:%S")
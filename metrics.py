@@ -0,0 +1,125 @@
+import bisect
+import threading
+import time
+
+from contextlib import contextmanager
+from flask import Response, before_render_template, g, has_app_context, request, template_rendered
+
+# Upper bounds, in seconds, of histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    """Prometheus-style histogram of durations, optionally split by one label."""
+
+    def __init__(self, name, description, label=None, buckets=BUCKETS):
+        self.name = name
+        self.description = description
+        self.label = label
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, value=None):
+        """Count one duration of seconds, for label value if split by label."""
+        with self._lock:
+            series = self._series.setdefault(value, [0] * (len(self.buckets) + 1) + [0, 0])
+            series[bisect.bisect_left(self.buckets, seconds)] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def expose(self):
+        """Return histogram in Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {value: list(counts) for value, counts in self._series.items()}
+        for value, counts in sorted(series.items(), key=lambda item: str(item[0])):
+            label = f'{self.label}="{value}",' if self.label else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts[:-2]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label}le="{bound}"}} {cumulative}')
+            label = f'{{{label.rstrip(",")}}}' if label else ""
+            lines.append(f"{self.name}_sum{label} {counts[-2]}")
+            lines.append(f"{self.name}_count{label} {counts[-1]}")
+        return lines
+
+
+# Time spent per request, and per kind of work within requests
+histograms = {
+    "request": Histogram("finance_request_seconds", "Time to handle a request.", label="endpoint"),
+    "db": Histogram("finance_db_seconds", "Time spent executing SQL statements."),
+    "quote": Histogram("finance_quote_seconds", "Time requests spent waiting for quotes."),
+    "fetch": Histogram("finance_quote_fetch_seconds", "Time spent fetching quotes from the provider."),
+    "render": Histogram("finance_render_seconds", "Time spent rendering templates.", label="template"),
+}
+
+
+def observe(kind, seconds, value=None):
+    """Record seconds spent on kind of work, overall and towards the current request's Server-Timing."""
+    histograms[kind].observe(seconds, value)
+    if has_app_context() and "timings" in g:
+        g.timings[kind] = g.timings.get(kind, 0) + seconds
+
+
+@contextmanager
+def timer(kind):
+    """Record how long block takes as kind of work."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(kind, time.perf_counter() - start)
+
+
+def timed(kind, f):
+    """Return f, recording how long each call takes as kind of work."""
+    def wrapper(*args, **kwargs):
+        with timer(kind):
+            return f(*args, **kwargs)
+    return wrapper
+
+
+def init_app(app, cache, server_timing=False):
+    """Time app's requests and templates, and expose them with cache's hits and misses on /metrics."""
+
+    @app.before_request
+    def start_timing():
+        g.timings = {}
+        g.started = time.perf_counter()
+
+    @app.after_request
+    def finish_timing(response):
+        if "started" not in g:
+            return response
+        total = time.perf_counter() - g.started
+        histograms["request"].observe(total, request.endpoint)
+
+        # Break request's time down for the browser's developer tools
+        if server_timing:
+            response.headers["Server-Timing"] = ", ".join(
+                [f"{kind};dur={seconds * 1000:.1f}" for kind, seconds in g.timings.items()] +
+                [f"total;dur={total * 1000:.1f}"])
+        return response
+
+    def start_render(sender, template, context, **extra):
+        g.render_started = time.perf_counter()
+
+    def finish_render(sender, template, context, **extra):
+        if "render_started" in g:
+            observe("render", time.perf_counter() - g.pop("render_started"), template.name)
+
+    before_render_template.connect(start_render, app, weak=False)
+    template_rendered.connect(finish_render, app, weak=False)
+
+    @app.route("/metrics")
+    def metrics():
+        """Expose metrics in Prometheus text format"""
+        lines = []
+        for histogram in histograms.values():
+            lines.extend(histogram.expose())
+        lines.extend(["# HELP finance_quote_cache_total Quote lookups answered from cache or not.",
+                      "# TYPE finance_quote_cache_total counter",
+                      f'finance_quote_cache_total{{result="hit"}} {cache.hits}',
+                      f'finance_quote_cache_total{{result="miss"}} {cache.misses}'])
+        return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
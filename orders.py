@@ -0,0 +1,191 @@
+import heapq
+import logging
+import threading
+import time
+
+import trades
+from helpers import cents, lookup
+
+# Failed fills and cycles are logged and retried, as their orders stay open
+log = logging.getLogger(__name__)
+
+# Order types and whether each fires when the price falls to its threshold (else when it rises to it)
+FALLING = {("buy", "limit"): True, ("sell", "limit"): False, ("buy", "stop"): False, ("sell", "stop"): True}
+
+
+def create(db, user_id, side, kind, symbol, shares, price):
+    """Store an open order for user, raising TradeError if invalid, and return its id."""
+    side, symbol, shares = trades.parse_order(side, symbol, shares)
+    if kind not in ("limit", "stop"):
+        raise trades.TradeError("invalid order type")
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        raise trades.TradeError("invalid price")
+    if not price > 0:
+        raise trades.TradeError("invalid price")
+
+    # Ensure symbol exists, or the order would stay open and be quoted every cycle forever
+    quote = lookup(symbol)
+    if quote is None:
+        raise trades.TradeError("invalid symbol")
+    symbol = quote["symbol"]
+    return db.execute("INSERT INTO orders (fkey, symbol, side, kind, shares, price, status, created) "
+                      "VALUES (:user_id, :symbol, :side, :kind, :shares, :price, 'open', :created)",
+                      user_id=user_id, symbol=symbol, side=side, kind=kind, shares=shares, price=cents(price),
+                      created=int(time.time()))
+
+
+def cancel(db, user_id, order_id):
+    """Cancel user's order if it's still open, returning whether it was."""
+    return db.execute("UPDATE orders SET status = 'cancelled' WHERE id = :order_id AND fkey = :user_id "
+                      "AND status = 'open'", order_id=order_id, user_id=user_id) == 1
+
+
+def fill(db, order, price):
+    """
+    Fill order at price through the trade path, returning its new status.
+
+    The order is claimed in the same transaction as the trade, so it's filled
+    at most once even if several processes see it trigger.
+    """
+    with db.transaction():
+        if db.execute("UPDATE orders SET status = 'filled', filled = :filled, fill_price = :fill_price "
+                      "WHERE id = :order_id AND status = 'open'",
+                      filled=int(time.time()), fill_price=cents(price), order_id=order["id"]) != 1:
+            return None
+        try:
+            if order["side"] == "buy":
+                trades.buy(db, order["fkey"], order["symbol"], order["shares"], price)
+            else:
+                trades.sell(db, order["fkey"], order["symbol"], order["shares"], price)
+        except trades.TradeError as e:
+            db.execute("UPDATE orders SET status = 'failed', error = :error WHERE id = :order_id",
+                       error=str(e), order_id=order["id"])
+            return "failed"
+    return "filled"
+
+
+class OrderBook:
+    """
+    Open orders indexed by symbol and threshold.
+
+    Each symbol has a max-heap of orders that fire when the price falls to
+    their threshold and a min-heap of orders that fire when it rises to it, so
+    finding triggered orders costs O(log n) each. Removed orders stay in their
+    heap until they reach the top and are skipped there.
+    """
+
+    def __init__(self):
+        self.orders = {}
+        self.last = 0
+        self._heaps = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def add(self, order):
+        """Index an open order (a dict with id, symbol, side, kind and price in cents)."""
+        with self._lock:
+            self.last = max(self.last, order["id"])
+            if order["id"] in self.orders:
+                return
+            self.orders[order["id"]] = order
+            falling, rising = self._heaps.setdefault(order["symbol"], ([], []))
+            if FALLING[(order["side"], order["kind"])]:
+                heapq.heappush(falling, (-order["price"], order["id"]))
+            else:
+                heapq.heappush(rising, (order["price"], order["id"]))
+            self._counts[order["symbol"]] = self._counts.get(order["symbol"], 0) + 1
+
+    def remove(self, order_id):
+        """Stop tracking an order, e.g. once it's cancelled."""
+        with self._lock:
+            order = self.orders.pop(order_id, None)
+            if order is not None:
+                self._forget(order["symbol"])
+
+    def symbols(self):
+        """Return the symbols with open orders."""
+        with self._lock:
+            return list(self._counts)
+
+    def triggered(self, symbol, price):
+        """Remove and return the orders for symbol that price triggers."""
+        price = cents(price)
+        fired = []
+        with self._lock:
+            falling, rising = self._heaps.get(symbol, ([], []))
+            while falling and -falling[0][0] >= price:
+                fired.append(heapq.heappop(falling)[1])
+            while rising and rising[0][0] <= price:
+                fired.append(heapq.heappop(rising)[1])
+
+            # Skip orders removed since they were indexed
+            orders = [self.orders.pop(order_id) for order_id in fired if order_id in self.orders]
+            for order in orders:
+                self._forget(symbol)
+        return orders
+
+    def _forget(self, symbol):
+        """Count one order fewer for symbol, dropping its heaps with its last order. Call with lock held."""
+        self._counts[symbol] -= 1
+        if not self._counts[symbol]:
+            del self._counts[symbol]
+            del self._heaps[symbol]
+
+
+class OrderScheduler:
+    """
+    Background loop filling limit and stop orders as prices reach them.
+
+    Each cycle quotes every symbol with open orders once, so its cost grows
+    with distinct symbols and triggered orders rather than with open orders.
+    """
+
+    def __init__(self, db, lookup_many, interval=60):
+        self.db = db
+        self.lookup_many = lookup_many
+        self.interval = interval
+        self.book = OrderBook()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start polling in the background, once."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="order-scheduler", daemon=True)
+                self._thread.start()
+
+    def sync(self):
+        """Index orders opened since the last sync, including by other processes."""
+        for order in self.db.execute("SELECT id, fkey, symbol, side, kind, shares, price FROM orders "
+                                     "WHERE status = 'open' AND id > :last ORDER BY id", last=self.book.last):
+            self.book.add(order)
+
+    def poll(self):
+        """Quote symbols with open orders and fill those triggered, returning how many were filled."""
+        self.sync()
+        quotes = self.lookup_many(self.book.symbols())
+        filled = 0
+        for symbol, quote in quotes.items():
+            for order in self.book.triggered(symbol, quote["price"]):
+                # Put order back if filling it failed, as sync only reads orders it hasn't seen
+                try:
+                    filled += fill(self.db, order, quote["price"]) == "filled"
+                except Exception:
+                    log.exception("Failed to fill order %s", order["id"])
+                    self.book.add(order)
+        return filled
+
+    def _run(self):
+        """Poll forever, giving the database connection back between cycles."""
+        while True:
+            started = time.monotonic()
+            try:
+                self.poll()
+            except Exception:
+                log.exception("Failed to poll orders")
+            finally:
+                self.db.release()
+            time.sleep(max(0, self.interval - (time.monotonic() - started)))
@@ -0,0 +1,133 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+from helpers import usd
+
+# Most users whose timeline is kept in memory
+TIMELINE_CACHE_SIZE = 4096
+
+# Last timeline per user, with the latest trade, cash and day it was computed for
+timelines = OrderedDict()
+timelines_lock = threading.Lock()
+
+# Seconds in a (UTC) day
+DAY = 86400
+
+
+def holdings(db, user_id):
+    """Return user's positions (symbol, share and cost basis) and cash in one indexed read."""
+    rows = db.execute("SELECT users.cash, buy.symbol, buy.share, buy.cost FROM users "
+                      "LEFT JOIN buy ON buy.fkey = users.id WHERE users.id = :user_id ORDER BY buy.symbol",
+                      user_id=user_id)
+    return [row for row in rows if row["symbol"] is not None], rows[0]["cash"]
+
+
+def value(positions, cash, quotes):
+    """Return template variables for index.html given positions and their quotes."""
+
+    # Initialise variables and array list
+    i = 0
+    share_value = 0
+    symbols = []
+    shares = []
+    costs = []
+    prices = []
+    totals = []
+
+    # Loop through each position and input to arrays
+    for row in positions:
+        quote = quotes.get(row["symbol"].upper())
+        if not quote == None:
+            i = i + 1
+            price = quote["price"]
+            total = row["share"] * price
+            share_value = share_value + total
+            symbols.append(row["symbol"])
+            shares.append(row["share"])
+            costs.append(usd(row["cost"]))
+            prices.append(usd(price))
+            totals.append(usd(total))
+
+    # Calculate the total cash
+    overall = cash + share_value
+
+    return dict(i=i, symbols=symbols, shares=shares, costs=costs, prices=prices, totals=totals,
+                total=usd(cash), overall=usd(overall))
+
+
+def timeline(db, store, user_id):
+    """Return user's daily portfolio value, recomputing it only after a trade or on a new day."""
+    row = db.execute("SELECT cash, (SELECT MAX(id) FROM history WHERE fkey = users.id) AS last FROM users "
+                     "WHERE id = :user_id", user_id=user_id)[0]
+    key = (row["last"], row["cash"], int(time.time()) // DAY)
+    with timelines_lock:
+        cached = timelines.get(user_id)
+        if cached is not None and cached[0] == key:
+            timelines.move_to_end(user_id)
+            return cached[1]
+
+    trades = db.execute("SELECT symbol, share, price, time FROM history WHERE fkey = :user_id ORDER BY id",
+                        user_id=user_id)
+    series = replay(trades, row["cash"], store, key[2])
+
+    # Remember timeline, forgetting least recently seen users
+    with timelines_lock:
+        timelines[user_id] = (key, series)
+        timelines.move_to_end(user_id)
+        while len(timelines) > TIMELINE_CACHE_SIZE:
+            timelines.popitem(last=False)
+    return series
+
+
+def replay(trades, cash, store, today):
+    """
+    Return daily cash, holdings and total value from the first trade to today.
+
+    Shares held are a days x symbols matrix summed up from trades, priced by
+    each day's last recorded price (or trade price), carried forward.
+    """
+    if not trades:
+        return dict(days=[], cash=[], holdings=[], value=[])
+
+    # Import numpy only once a timeline is needed, as it's slow to import
+    import numpy as np
+    symbols = sorted({row["symbol"] for row in trades})
+    columns = {symbol: i for i, symbol in enumerate(symbols)}
+    column = np.array([columns[row["symbol"]] for row in trades])
+    shares = np.array([row["share"] for row in trades], dtype=np.int64)
+    price = np.array([row["price"] for row in trades], dtype=np.float64) / 100
+    day = np.array([row["time"] for row in trades], dtype=np.int64) // DAY
+    first = int(day.min())
+    day -= first
+    days = max(today, first + int(day.max())) - first + 1
+
+    # Shares held at the end of each day
+    held = np.zeros((days, len(symbols)))
+    np.add.at(held, (day, column), shares)
+    held = held.cumsum(axis=0)
+
+    # Cash at the end of each day, undoing later trades from today's cash
+    flow = np.zeros(days)
+    np.add.at(flow, day, -shares * price)
+    cash = cash - (flow.sum() - flow.cumsum())
+
+    # Each day's last price, from trades and then from the price store
+    prices = np.full((days, len(symbols)), np.nan)
+    prices[day, column] = price
+    for i, symbol in enumerate(symbols):
+        records = store.read(symbol, first * DAY)
+        if len(records):
+            recorded = records["time"] // DAY - first
+            last = np.r_[recorded[1:] != recorded[:-1], True]
+            prices[recorded[last], i] = records["close"][last]
+
+    # Carry prices forward over days without one
+    observed = np.where(np.isnan(prices), 0, np.arange(days)[:, None])
+    prices = np.nan_to_num(prices[np.maximum.accumulate(observed, axis=0), np.arange(len(symbols))])
+
+    holdings = (held * prices).sum(axis=1)
+    return dict(days=[time.strftime("%Y-%m-%d", time.gmtime((first + i) * DAY)) for i in range(days)],
+                cash=cash.round(2).tolist(), holdings=holdings.round(2).tolist(),
+                value=(cash + holdings).round(2).tolist())
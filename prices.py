@@ -0,0 +1,118 @@
+import fcntl
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+# One fixed-width record per observation, appended in time order
+RECORD = np.dtype([("time", "<i8"), ("open", "<f8"), ("high", "<f8"),
+                   ("low", "<f8"), ("close", "<f8"), ("volume", "<f8")])
+
+# Symbols that are safe to use as file names
+SYMBOL = re.compile(r"^[A-Z0-9.\-]{1,16}$")
+
+
+class PriceStore:
+    """
+    Append-only files of OHLCV records, one per symbol, read through memory maps.
+
+    Records are kept in time order and a record no newer than a symbol's last
+    one is dropped, so replaying the same quotes never duplicates them. Appends
+    lock the file, so workers sharing a directory keep it in order too.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def append(self, symbol, row):
+        """Add a (time, open, high, low, close, volume) row for symbol, returning whether it was new."""
+        symbol = symbol.upper()
+        if not SYMBOL.match(symbol):
+            return False
+        record = np.array([tuple(row)], dtype=RECORD)
+        when = int(record["time"][0])
+        with self._lock:
+
+            # Files only grow newer, so a record no newer than the last one seen here is old everywhere
+            if when <= self._last.get(symbol, when - 1):
+                return False
+
+            # Check the file's own last record, which another process may have written, under its lock
+            with open(self._path(symbol), "a+b") as file:
+                fcntl.flock(file, fcntl.LOCK_EX)
+                size = file.seek(0, os.SEEK_END) // RECORD.itemsize
+                if size:
+                    file.seek((size - 1) * RECORD.itemsize)
+                    last = int(np.frombuffer(file.read(RECORD.itemsize), dtype=RECORD)["time"][0])
+                    if when <= last:
+                        self._last[symbol] = last
+                        return False
+                file.write(record.tobytes())
+            self._last[symbol] = when
+        return True
+
+    def observe(self, quote):
+        """Record quote, as returned by a provider, as a one-price record now, and return it."""
+        if quote is not None:
+            price = quote["price"]
+
+            # Never fail a quote because it couldn't be kept
+            try:
+                self.append(quote["symbol"], (int(time.time()), price, price, price, price, 0))
+            except OSError:
+                pass
+        return quote
+
+    def read(self, symbol, start=None, end=None):
+        """Return symbol's records with start <= time < end as a (memory-mapped) structured array."""
+        path = self._path(symbol.upper())
+        try:
+            size = os.path.getsize(path) // RECORD.itemsize
+        except OSError:
+            size = 0
+        if not size:
+            return np.empty(0, dtype=RECORD)
+
+        # Map only whole records, in case a write is under way
+        records = np.memmap(path, dtype=RECORD, mode="r", shape=(size,))
+        times = records["time"]
+        lo = 0 if start is None else np.searchsorted(times, start, "left")
+        hi = size if end is None else np.searchsorted(times, end, "left")
+        return records[lo:hi]
+
+    def chart(self, symbol, start, end, interval):
+        """Return symbol's records with start <= time < end as bars of interval seconds."""
+        return downsample(self.read(symbol, start, end), start, interval)
+
+    def _path(self, symbol):
+        """Return the file holding symbol's records."""
+        return os.path.join(self.directory, symbol + ".bin")
+
+
+def downsample(records, start, interval):
+    """
+    Aggregate records into bars of interval seconds counted from start.
+
+    Returns a dict of columns (time, open, high, low, close, volume) with one
+    entry per non-empty bar.
+    """
+    if not len(records):
+        return {name: [] for name in RECORD.names}
+
+    # Records are sorted by time, so each bar is a contiguous run of them
+    bars = (records["time"] - start) // interval
+    starts = np.flatnonzero(np.r_[True, bars[1:] != bars[:-1]])
+    ends = np.r_[starts[1:], len(records)] - 1
+    return {
+        "time": (start + bars[starts] * interval).tolist(),
+        "open": records["open"][starts].tolist(),
+        "high": np.maximum.reduceat(records["high"], starts).tolist(),
+        "low": np.minimum.reduceat(records["low"], starts).tolist(),
+        "close": records["close"][ends].tolist(),
+        "volume": np.add.reduceat(records["volume"], starts).tolist(),
+    }
@@ -0,0 +1,255 @@
+import asyncio
+import csv
+import http.client
+import io
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+
+from urllib.parse import urlencode
+
+
+class ProviderError(Exception):
+    """Raised when a provider can't answer, as opposed to a symbol being invalid."""
+
+
+class QuoteProvider:
+    """Source of latest stock quotes."""
+
+    def quote(self, symbol):
+        """Return quote for symbol, None if symbol is invalid, raising ProviderError on failure."""
+        raise NotImplementedError
+
+    async def quote_async(self, symbol):
+        """Like quote(), but as a coroutine; runs quote() in a thread unless overridden."""
+        return await asyncio.to_thread(self.quote, symbol)
+
+
+class AlphaVantageProvider(QuoteProvider):
+    """
+    Quotes from Alpha Vantage's latest quote endpoint over keep-alive connections.
+
+    https://www.alphavantage.co/documentation/#latestprice
+    """
+
+    host = "www.alphavantage.co"
+
+    def __init__(self, api_key, pool_size=8, timeout=5):
+        if not api_key:
+            raise RuntimeError("API_KEY not set")
+        self.api_key = api_key
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+        # Keep-alive streams for quote_async, used from one event loop
+        self._streams = []
+
+    def quote(self, symbol):
+        path = "/query?" + urlencode({"apikey": self.api_key, "datatype": "csv",
+                                      "function": "GLOBAL_QUOTE", "symbol": symbol})
+
+        # Retry once on a fresh connection if a pooled one was closed by the server
+        for attempt in range(2):
+            conn, reused = self._acquire()
+            try:
+                conn.request("GET", path)
+                response = conn.getresponse()
+                if response.status != 200:
+                    raise ProviderError(f"HTTP {response.status}")
+                quote = parse_global_quote(response)
+
+                # Drain the (tiny) rest of the body so the connection can be reused
+                response.read()
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise ProviderError(str(e)) from e
+            except Exception:
+                conn.close()
+                raise
+            self._release(conn)
+            return quote
+
+    async def quote_async(self, symbol):
+        path = "/query?" + urlencode({"apikey": self.api_key, "datatype": "csv",
+                                      "function": "GLOBAL_QUOTE", "symbol": symbol})
+
+        # Retry once on a fresh connection if a pooled one was closed by the server
+        for attempt in range(2):
+            streams, reused = await self._acquire_async()
+            reader, writer = streams
+            try:
+                writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\n\r\n".encode("ascii"))
+                await writer.drain()
+                status, body = await asyncio.wait_for(read_response(reader), self.timeout)
+                if status != 200:
+                    raise ProviderError(f"HTTP {status}")
+                quote = parse_global_quote(io.BytesIO(body))
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError, OSError) as e:
+                writer.close()
+                if reused and attempt == 0:
+                    continue
+                raise ProviderError(str(e)) from e
+            except Exception:
+                writer.close()
+                raise
+            self._release_async(streams)
+            return quote
+
+    async def _acquire_async(self):
+        """Return idle pooled streams, or newly opened ones, and whether they were pooled."""
+        while self._streams:
+            streams = self._streams.pop()
+            if not streams[0].at_eof():
+                return streams, True
+            streams[1].close()
+        streams = await asyncio.wait_for(asyncio.open_connection(self.host, 443, ssl=True), self.timeout)
+        return streams, False
+
+    def _release_async(self, streams):
+        """Return streams to the pool, closing them if the pool is full."""
+        if len(self._streams) < self._pool.maxsize:
+            self._streams.append(streams)
+        else:
+            streams[1].close()
+
+    def _acquire(self):
+        """Return an idle pooled connection, or a new one, and whether it was pooled."""
+        try:
+            return self._pool.get_nowait(), True
+        except queue.Empty:
+            return http.client.HTTPSConnection(self.host, timeout=self.timeout), False
+
+    def _release(self, conn):
+        """Return conn to the pool, closing it if the pool is full."""
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+async def read_response(reader):
+    """Read an HTTP/1.1 response from reader, returning its status and body."""
+    line = await reader.readline()
+
+    # A pooled connection the server closed reads as EOF, which the caller retries
+    if not line.endswith(b"\n"):
+        raise asyncio.IncompleteReadError(line, None)
+    try:
+        status = int(line.split()[1])
+    except (IndexError, ValueError):
+        raise ProviderError(f"malformed status line {line[:64]!r}")
+
+    # Read headers up to the blank line
+    headers = {}
+    while True:
+        line = (await reader.readline()).strip()
+        if not line:
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    # Read body, which is either chunked or of known length
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        body = b""
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                await reader.readline()
+                return status, body
+            body += await reader.readexactly(size)
+            await reader.readline()
+    return status, await reader.readexactly(int(headers.get("content-length", 0)))
+
+
+def parse_global_quote(response):
+    """Parse a GLOBAL_QUOTE CSV response, reading no further than its first data row."""
+
+    # Alpha Vantage answers errors and rate limiting with JSON instead of CSV
+    header = response.readline().decode("utf-8")
+    if header.lstrip().startswith("{"):
+        message = json.loads(header + response.read().decode("utf-8"))
+        if "Error Message" in message:
+            return None
+        raise ProviderError(message.get("Note") or message.get("Information") or "unexpected response")
+
+    # symbol,open,high,low,price,volume,latestDay,previousClose,change,changePercent
+    row = next(csv.reader([response.readline().decode("utf-8")]), [])
+
+    # Ensure stock exists
+    try:
+        price = float(row[4])
+    except (IndexError, ValueError):
+        return None
+
+    # Return stock's price (as a float) and (uppercased) symbol (as a str)
+    return {
+        "price": price,
+        "symbol": row[0].upper()
+    }
+
+
+class LocalProvider(QuoteProvider):
+    """
+    Replay recorded prices without any network access.
+
+    Prices come from a dict of symbol to price (or list of prices) and/or a CSV
+    file of symbol,price rows. A symbol with several prices cycles through them,
+    one per quote, so load tests and CI see prices move. Each quote takes
+    latency seconds, to stand in for a real provider's round trip.
+    """
+
+    def __init__(self, prices=None, path=None, latency=0):
+        self.latency = latency
+        recorded = {}
+        for symbol, price in (prices or {}).items():
+            recorded[symbol.upper()] = list(price) if isinstance(price, (list, tuple)) else [price]
+        if path:
+            with open(path, newline="") as file:
+                for row in csv.reader(file):
+                    if len(row) >= 2 and not row[0].startswith("#"):
+                        try:
+                            recorded.setdefault(row[0].strip().upper(), []).append(float(row[1]))
+                        except ValueError:
+                            continue
+        self._prices = {symbol: itertools.cycle(prices) for symbol, prices in recorded.items() if prices}
+        self._lock = threading.Lock()
+
+    def quote(self, symbol):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._next(symbol)
+
+    async def quote_async(self, symbol):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._next(symbol)
+
+    def _next(self, symbol):
+        """Return symbol's next recorded price as a quote."""
+        symbol = symbol.upper()
+        with self._lock:
+            prices = self._prices.get(symbol)
+            if prices is None:
+                return None
+            price = float(next(prices))
+        return {
+            "price": price,
+            "symbol": symbol
+        }
+
+
+def provider_from_env():
+    """Build the provider named by QUOTE_PROVIDER (alphavantage or local)."""
+    name = os.getenv("QUOTE_PROVIDER", "alphavantage")
+    if name == "alphavantage":
+        return AlphaVantageProvider(os.getenv("API_KEY"),
+                                    pool_size=int(os.getenv("QUOTE_WORKERS", 16)),
+                                    timeout=float(os.getenv("QUOTE_DEADLINE", 5)))
+    elif name == "local":
+        return LocalProvider(path=os.getenv("QUOTE_FILE"), latency=float(os.getenv("QUOTE_LATENCY", 0)))
+    raise RuntimeError(f"unknown QUOTE_PROVIDER {name}")
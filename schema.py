@@ -0,0 +1,176 @@
+import time
+
+# Changes to finance.db, applied in order by migrate() when the app starts
+MIGRATIONS = [
+
+    # Page through a user's history by id without scanning the whole table
+    ("history_fkey_id", [
+        "CREATE INDEX IF NOT EXISTS 'history_fkey_id' ON 'history' ('fkey', 'id')",
+    ]),
+
+    # Keep one holding per user and symbol so trades can upsert it
+    ("buy_fkey_symbol", [
+        "UPDATE buy SET share = (SELECT SUM(share) FROM buy AS b WHERE b.fkey = buy.fkey AND b.symbol = buy.symbol) "
+        "WHERE id IN (SELECT MIN(id) FROM buy GROUP BY fkey, symbol)",
+        "DELETE FROM buy WHERE id NOT IN (SELECT MIN(id) FROM buy GROUP BY fkey, symbol)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS 'buy_fkey_symbol' ON 'buy' ('fkey', 'symbol')",
+    ]),
+
+    # Maintain each holding's cost basis alongside its shares
+    ("buy_cost", [
+        "ALTER TABLE buy ADD COLUMN 'cost' NUMERIC NOT NULL DEFAULT 0",
+        lambda db: backfill_cost(db),
+    ]),
+
+    # Store history's prices as integer cents and times as epoch seconds, instead of text
+    ("history_numeric", [
+        "CREATE TABLE 'history_numeric' ('id' INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, 'fkey' INTEGER NOT NULL, "
+        "symbol TEXT NOT NULL, price INTEGER NOT NULL, share INTEGER NOT NULL, 'time' INTEGER NOT NULL, "
+        "FOREIGN KEY ('fkey') REFERENCES 'users'('id'))",
+        "INSERT INTO history_numeric (id, fkey, symbol, price, share, time) "
+        "SELECT id, fkey, symbol, "
+        "CAST(ROUND(CASE WHEN typeof(price) = 'text' THEN CAST(REPLACE(REPLACE(price, '$', ''), ',', '') AS REAL) "
+        "ELSE price END * 100) AS INTEGER), "
+        "share, CASE WHEN typeof(time) = 'text' THEN CAST(strftime('%s', time, 'utc') AS INTEGER) ELSE time END "
+        "FROM history",
+        "DROP TABLE history",
+        "ALTER TABLE history_numeric RENAME TO history",
+        "CREATE INDEX IF NOT EXISTS 'history_fkey_id' ON 'history' ('fkey', 'id')",
+    ]),
+
+    # Roll trades up per user, symbol and day, with volume and realized P&L in cents
+    ("rollups", [
+        "CREATE TABLE 'rollups' ('fkey' INTEGER NOT NULL, 'symbol' TEXT NOT NULL, 'day' TEXT NOT NULL, "
+        "'bought' INTEGER NOT NULL DEFAULT 0, 'sold' INTEGER NOT NULL DEFAULT 0, "
+        "'volume' INTEGER NOT NULL DEFAULT 0, 'realized' INTEGER NOT NULL DEFAULT 0, "
+        "PRIMARY KEY ('fkey', 'symbol', 'day'), FOREIGN KEY ('fkey') REFERENCES 'users'('id'))",
+        lambda db: backfill_rollups(db),
+    ]),
+
+    # Store sessions so they survive restarts and are shared between workers
+    ("sessions", [
+        "CREATE TABLE 'sessions' ('sid' TEXT PRIMARY KEY NOT NULL, 'data' TEXT NOT NULL, 'expires' INTEGER NOT NULL)",
+        "CREATE INDEX 'sessions_expires' ON 'sessions' ('expires')",
+    ]),
+
+    # Keep limit and stop orders until they're filled or cancelled, with prices in cents
+    ("orders", [
+        "CREATE TABLE 'orders' ('id' INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, 'fkey' INTEGER NOT NULL, "
+        "'symbol' TEXT NOT NULL, 'side' TEXT NOT NULL, 'kind' TEXT NOT NULL, 'shares' INTEGER NOT NULL, "
+        "'price' INTEGER NOT NULL, 'status' TEXT NOT NULL, 'created' INTEGER NOT NULL, 'filled' INTEGER, "
+        "'fill_price' INTEGER, 'error' TEXT, FOREIGN KEY ('fkey') REFERENCES 'users'('id'))",
+        "CREATE INDEX 'orders_fkey_id' ON 'orders' ('fkey', 'id')",
+        "CREATE INDEX 'orders_open' ON 'orders' ('id') WHERE status = 'open'",
+    ]),
+
+    # Authenticate API clients by the SHA-256 of their bearer token
+    ("tokens", [
+        "CREATE TABLE 'tokens' ('hash' TEXT PRIMARY KEY NOT NULL, 'fkey' INTEGER NOT NULL, 'created' INTEGER NOT NULL, "
+        "FOREIGN KEY ('fkey') REFERENCES 'users'('id'))",
+    ]),
+
+    # Keep site-wide shares held, volume (in cents) and trades per symbol and per day
+    ("stats", [
+        "CREATE TABLE 'symbol_stats' ('symbol' TEXT PRIMARY KEY NOT NULL, 'held' INTEGER NOT NULL DEFAULT 0, "
+        "'volume' INTEGER NOT NULL DEFAULT 0, 'trades' INTEGER NOT NULL DEFAULT 0)",
+        "CREATE TABLE 'daily_stats' ('day' TEXT PRIMARY KEY NOT NULL, "
+        "'volume' INTEGER NOT NULL DEFAULT 0, 'trades' INTEGER NOT NULL DEFAULT 0)",
+        "INSERT INTO symbol_stats (symbol, volume, trades) "
+        "SELECT symbol, SUM(ABS(share) * price), COUNT(*) FROM history GROUP BY symbol",
+        "INSERT OR IGNORE INTO symbol_stats (symbol) SELECT DISTINCT symbol FROM buy",
+        "UPDATE symbol_stats SET held = (SELECT COALESCE(SUM(share), 0) FROM buy WHERE buy.symbol = symbol_stats.symbol)",
+        "INSERT INTO daily_stats (day, volume, trades) "
+        "SELECT strftime('%Y-%m-%d', time, 'unixepoch'), SUM(ABS(share) * price), COUNT(*) FROM history GROUP BY 1",
+    ]),
+
+    # Expire bearer tokens, giving those issued so far 30 days from when they were
+    ("tokens_expires", [
+        "ALTER TABLE tokens ADD COLUMN 'expires' INTEGER NOT NULL DEFAULT 0",
+        "UPDATE tokens SET expires = created + 2592000",
+        "CREATE INDEX 'tokens_expires' ON 'tokens' ('expires')",
+        "CREATE INDEX 'tokens_fkey' ON 'tokens' ('fkey', 'created')",
+    ]),
+
+    # Keep site-wide users and cash in one row, maintained as users sign up and trade, instead of scanning users
+    ("site_stats", [
+        "CREATE TABLE 'site_stats' ('id' INTEGER PRIMARY KEY CHECK (id = 1), 'users' INTEGER NOT NULL, "
+        "'cash' NUMERIC NOT NULL)",
+        "INSERT INTO site_stats (id, users, cash) SELECT 1, COUNT(*), COALESCE(SUM(cash), 0) FROM users",
+        "CREATE TRIGGER 'site_stats_insert' AFTER INSERT ON 'users' "
+        "BEGIN UPDATE site_stats SET users = users + 1, cash = cash + NEW.cash; END",
+        "CREATE TRIGGER 'site_stats_cash' AFTER UPDATE OF cash ON 'users' "
+        "BEGIN UPDATE site_stats SET cash = cash - OLD.cash + NEW.cash; END",
+        "CREATE TRIGGER 'site_stats_delete' AFTER DELETE ON 'users' "
+        "BEGIN UPDATE site_stats SET users = users - 1, cash = cash - OLD.cash; END",
+    ]),
+]
+
+
+def backfill_cost(db):
+    """Compute each holding's cost basis at average cost by replaying history."""
+    costs = {}
+    held = {}
+    for row in db.execute("SELECT fkey, symbol, price, share FROM history ORDER BY id"):
+        key = (row["fkey"], row["symbol"])
+        if row["share"] > 0:
+            costs[key] = costs.get(key, 0) + row["share"] * parse_usd(row["price"])
+        elif held.get(key):
+            costs[key] = costs.get(key, 0) * (held[key] + row["share"]) / held[key]
+        held[key] = held.get(key, 0) + row["share"]
+
+    for (user_id, symbol), cost in costs.items():
+        db.execute("UPDATE buy SET cost = :cost WHERE fkey = :user_id AND symbol = :symbol",
+                   cost=round(cost, 2), user_id=user_id, symbol=symbol)
+
+
+def backfill_rollups(db):
+    """Build rollups by replaying history at average cost."""
+    held = {}
+    days = {}
+    for row in db.execute("SELECT fkey, symbol, price, share, time FROM history ORDER BY id"):
+        key = (row["fkey"], row["symbol"])
+        shares, cost = held.get(key, (0, 0))
+        day = days.setdefault(key + (time.strftime("%Y-%m-%d", time.gmtime(row["time"])),), [0, 0, 0, 0])
+
+        # Track bought and sold shares, volume and realized P&L in cents
+        if row["share"] > 0:
+            held[key] = (shares + row["share"], cost + row["share"] * row["price"])
+            day[0] += row["share"]
+        else:
+            basis = cost * -row["share"] / shares if shares else 0
+            held[key] = (shares + row["share"], cost - basis)
+            day[1] -= row["share"]
+            day[3] += round(-row["share"] * row["price"] - basis)
+        day[2] += abs(row["share"]) * row["price"]
+
+    for (user_id, symbol, day), (bought, sold, volume, realized) in days.items():
+        db.execute("INSERT INTO rollups (fkey, symbol, day, bought, sold, volume, realized) "
+                   "VALUES (:user_id, :symbol, :day, :bought, :sold, :volume, :realized)",
+                   user_id=user_id, symbol=symbol, day=day, bought=bought, sold=sold, volume=volume, realized=realized)
+
+
+def parse_usd(value):
+    """Parse a price stored as a number or formatted by usd()."""
+    if isinstance(value, str):
+        return float(value.replace("$", "").replace(",", ""))
+    return value
+
+
+def migrate(db):
+    """Apply any migrations db hasn't had yet."""
+    db.execute("CREATE TABLE IF NOT EXISTS 'migrations' ('name' TEXT PRIMARY KEY NOT NULL)")
+
+    for name, steps in MIGRATIONS:
+        with db.transaction():
+
+            # Skip migrations already applied, perhaps by another worker
+            if db.execute("SELECT name FROM migrations WHERE name = :name", name=name):
+                continue
+
+            # Steps are SQL statements or functions taking db
+            for step in steps:
+                if callable(step):
+                    step(db)
+                else:
+                    db.execute(step)
+            db.execute("INSERT INTO migrations (name) VALUES (:name)", name=name)
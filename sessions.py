@@ -0,0 +1,102 @@
+import json
+import logging
+import secrets
+import threading
+import time
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+# Failed cleanups are logged and retried, as expired sessions are never loaded anyway
+log = logging.getLogger(__name__)
+
+
+class SqliteSession(CallbackDict, SessionMixin):
+    """Session stored as a row of the sessions table."""
+
+    def __init__(self, initial=None, sid=None, expires=0):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires = expires
+        self.modified = False
+        self.regenerate = False
+
+    def clear(self):
+        # Give a cleared session, e.g. at login, a new id so old cookies can't reuse it
+        super().clear()
+        self.regenerate = True
+
+
+class SqliteSessionInterface(SessionInterface):
+    """
+    Keep sessions as compact JSON in an SQLite table, so they survive restarts
+    and are shared by every worker using the same database.
+    """
+
+    def __init__(self, db, lifetime=86400, cleanup_interval=300):
+        self.db = db
+        self.lifetime = lifetime
+        self.cleanup_interval = cleanup_interval
+        self._cleaner = None
+        self._lock = threading.Lock()
+
+    def open_session(self, app, request):
+        self._start_cleaner()
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            rows = self.db.execute("SELECT data, expires FROM sessions WHERE sid = :sid AND expires > :now",
+                                   sid=sid, now=int(time.time()))
+            if rows:
+                return SqliteSession(json.loads(rows[0]["data"]), sid, rows[0]["expires"])
+        return SqliteSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        # Forget an emptied session entirely
+        if not session:
+            if session.sid is not None and (session.modified or session.regenerate):
+                self.db.execute("DELETE FROM sessions WHERE sid = :sid", sid=session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        # Only write when something changed or half the session's lifetime has passed
+        now = int(time.time())
+        if session.sid is not None and not session.modified and not session.regenerate \
+                and session.expires - now > self.lifetime / 2:
+            return
+
+        if session.regenerate and session.sid is not None:
+            self.db.execute("DELETE FROM sessions WHERE sid = :sid", sid=session.sid)
+            session.sid = None
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+        session.expires = now + self.lifetime
+        self.db.execute("INSERT INTO sessions (sid, data, expires) VALUES (:sid, :data, :expires) "
+                        "ON CONFLICT (sid) DO UPDATE SET data = excluded.data, expires = excluded.expires",
+                        sid=session.sid, data=json.dumps(dict(session), separators=(",", ":")), expires=session.expires)
+        response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+
+    def _start_cleaner(self):
+        """Start deleting expired sessions in the background, once."""
+        with self._lock:
+            if self._cleaner is None:
+                self._cleaner = threading.Thread(target=self._clean, name="session-cleaner", daemon=True)
+                self._cleaner.start()
+
+    def _clean(self):
+        """Delete expired sessions every cleanup_interval seconds."""
+        while True:
+            try:
+                self.db.execute("DELETE FROM sessions WHERE expires <= :now", now=int(time.time()))
+            except Exception:
+                log.exception("Failed to delete expired sessions")
+            finally:
+                self.db.release()
+            time.sleep(self.cleanup_interval)
@@ -0,0 +1,25 @@
+// Suggest listed symbols as the user types into a form's symbol field
+document.querySelectorAll("input[list=symbols]").forEach(function(input) {
+    var list = document.getElementById("symbols");
+    var pending;
+    input.addEventListener("input", function() {
+        clearTimeout(pending);
+        pending = setTimeout(function() {
+            if (!input.value) {
+                list.innerHTML = "";
+                return;
+            }
+            fetch("/symbols?prefix=" + encodeURIComponent(input.value), {credentials: "same-origin"})
+                .then(function(response) { return response.json(); })
+                .then(function(matches) {
+                    list.innerHTML = "";
+                    matches.forEach(function(match) {
+                        var option = document.createElement("option");
+                        option.value = match.symbol;
+                        option.textContent = match.name;
+                        list.appendChild(option);
+                    });
+                });
+        }, 150);
+    });
+});
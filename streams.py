@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+
+# Failed polls are logged and retried next cycle, so one upstream error doesn't end every stream
+log = logging.getLogger(__name__)
+
+
+class PricePoller:
+    """
+    Single background loop polling quotes for every symbol someone is watching.
+
+    Subscribers get a queue that is signalled whenever a price they watch changes,
+    so upstream traffic grows with distinct symbols rather than with viewers.
+    """
+
+    def __init__(self, lookup_many, interval=60):
+        self.lookup_many = lookup_many
+        self.interval = interval
+        self.prices = {}
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, symbols, signal=None):
+        """Return a queue (or given signal) signalled when the price of any of symbols changes."""
+        if signal is None:
+            signal = queue.Queue(maxsize=1)
+        with self._lock:
+            for symbol in symbols:
+                self._subscribers.setdefault(symbol.upper(), set()).add(signal)
+
+            # Start polling on first subscriber
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="price-poller", daemon=True)
+                self._thread.start()
+        return signal
+
+    def unsubscribe(self, signal, symbols):
+        """Stop signalling queue about symbols."""
+        with self._lock:
+            for symbol in symbols:
+                watchers = self._subscribers.get(symbol.upper())
+                if watchers is not None:
+                    watchers.discard(signal)
+                    if not watchers:
+                        del self._subscribers[symbol.upper()]
+                        self.prices.pop(symbol.upper(), None)
+
+    def resubscribe(self, signal, old, new):
+        """Move signal from old symbols to new ones, keeping the prices of symbols in both."""
+        self.subscribe(new, signal)
+        self.unsubscribe(signal, {symbol.upper() for symbol in old} - {symbol.upper() for symbol in new})
+
+    def quotes(self, symbols):
+        """Return the latest polled quotes for symbols."""
+        with self._lock:
+            return {symbol.upper(): self.prices[symbol.upper()] for symbol in symbols if symbol.upper() in self.prices}
+
+    def _run(self):
+        """Poll watched symbols forever, signalling watchers of changed prices."""
+        while True:
+            started = time.monotonic()
+            with self._lock:
+                symbols = list(self._subscribers)
+            if symbols:
+                try:
+                    quotes = self.lookup_many(symbols)
+                except Exception:
+                    log.exception("Failed to poll prices")
+                    quotes = {}
+                with self._lock:
+                    changed = set()
+                    for symbol, quote in quotes.items():
+                        if symbol in self._subscribers and self.prices.get(symbol) != quote:
+                            self.prices[symbol] = quote
+                            changed.update(self._subscribers[symbol])
+
+                # Coalesce signals for subscribers that haven't caught up yet
+                for signal in changed:
+                    try:
+                        signal.put_nowait(True)
+                    except queue.Full:
+                        pass
+            time.sleep(max(0, self.interval - (time.monotonic() - started)))
+
+
+class AsyncSignal:
+    """
+    Signal for a coroutine, set from the polling thread in place of a queue.
+
+    Waiting on it holds no thread, so an open stream costs only a coroutine.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+
+    def put_nowait(self, item):
+        """Wake the waiting coroutine, from any thread."""
+        self._loop.call_soon_threadsafe(self._event.set)
+
+    async def get(self, timeout):
+        """Wait up to timeout seconds to be signalled, raising TimeoutError otherwise."""
+        await asyncio.wait_for(self._event.wait(), timeout)
+        self._event.clear()
@@ -0,0 +1,40 @@
+import bisect
+import csv
+
+
+class SymbolDirectory:
+    """
+    Known ticker symbols and company names, loaded once from a CSV file.
+
+    Symbols are kept in one sorted list, so a prefix search is a binary search
+    followed by a short scan.
+    """
+
+    def __init__(self, path):
+        """Load symbol,name rows from path, skipping a header and comments."""
+        names = {}
+        with open(path, newline="") as file:
+            for row in csv.reader(file):
+                if not row or row[0].startswith("#") or row[0].strip().lower() == "symbol":
+                    continue
+                names[row[0].strip().upper()] = row[1].strip() if len(row) > 1 else ""
+        self.symbols = sorted(names)
+        self.names = [names[symbol] for symbol in self.symbols]
+
+    def __contains__(self, symbol):
+        symbol = symbol.upper()
+        i = bisect.bisect_left(self.symbols, symbol)
+        return i < len(self.symbols) and self.symbols[i] == symbol
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def search(self, prefix, limit=10):
+        """Return up to limit (symbol, name) pairs whose symbol starts with prefix, in order."""
+        prefix = prefix.upper()
+        matches = []
+        i = bisect.bisect_left(self.symbols, prefix)
+        while i < len(self.symbols) and len(matches) < limit and self.symbols[i].startswith(prefix):
+            matches.append((self.symbols[i], self.names[i]))
+            i += 1
+        return matches
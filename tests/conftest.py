@@ -0,0 +1,35 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+# Import the app's modules as the app itself does, from the repository's root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import Database  # noqa: E402
+from schema import migrate  # noqa: E402
+
+
+@pytest.fixture
+def bundled(tmp_path):
+    """Return the path of a throwaway copy of the bundled finance.db, not yet migrated."""
+    path = tmp_path / "finance.db"
+    shutil.copy(os.path.join(ROOT, "finance.db"), path)
+    return str(path)
+
+
+@pytest.fixture
+def db(bundled):
+    """Return a fully migrated copy of the bundled finance.db."""
+    database = Database(bundled)
+    database.setup = migrate
+    yield database
+    database.release()
+
+
+@pytest.fixture
+def user(db):
+    """Return the id of a new user with $1,000 and no holdings."""
+    return db.execute("INSERT INTO users (username, hash, cash) VALUES ('test', 'x', 1000)")
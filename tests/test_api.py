@@ -0,0 +1,81 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+import helpers
+from application import create_app
+from config import Config
+
+
+@pytest.fixture
+def client(bundled, monkeypatch):
+    """Return a test client of an app on a copy of the bundled database, quoting nothing over the network."""
+    monkeypatch.setenv("QUOTE_PROVIDER", "local")
+    helpers.quote_provider.cache_clear()
+
+    class Testing(Config):
+        DATABASE = bundled
+        PASSWORD_METHOD = "pbkdf2:sha256:1"
+        HASH_WORKERS = 0
+        SESSION_BACKEND = "cookie"
+        SECRET_KEY = "test"
+        TOKEN_LIFETIME = 60
+
+    app = create_app(Testing)
+    app.extensions["db"].execute("INSERT INTO users (username, hash, cash) VALUES ('api', :hash, 1000)",
+                                 hash=generate_password_hash("secret", "pbkdf2:sha256:1"))
+    yield app.test_client()
+    app.extensions["db"].release()
+    helpers.quote_provider.cache_clear()
+
+
+def issue(client, **data):
+    return client.post("/api/v1/tokens", json=data)
+
+
+def bearer(token):
+    return {"Authorization": "Bearer " + token}
+
+
+def test_issue_token(client):
+    response = issue(client, username="api", password="secret")
+    assert response.status_code == 201
+    token = response.get_json()["token"]
+
+    response = client.get("/api/v1/portfolio", headers=bearer(token))
+    assert response.status_code == 200
+    assert response.get_json() == {"cash": 1000, "positions": [], "total": 1000}
+
+
+def test_issue_token_rejected(client):
+    assert issue(client, username="api", password="wrong").status_code == 403
+    assert issue(client, username="api").status_code == 400
+    assert issue(client, username=["api"], password="secret").status_code == 400
+    assert issue(client, username="api", password=1).status_code == 400
+
+
+def test_unauthorized(client):
+    assert client.get("/api/v1/portfolio").status_code == 401
+    assert client.get("/api/v1/portfolio", headers=bearer("nope")).status_code == 401
+    assert client.get("/api/v1/portfolio", headers={"Authorization": "Basic nope"}).status_code == 401
+
+
+def test_token_expires(client):
+    token = issue(client, username="api", password="secret").get_json()["token"]
+    client.application.extensions["db"].execute("UPDATE tokens SET expires = 0")
+    response = client.get("/api/v1/portfolio", headers=bearer(token))
+    assert response.status_code == 401
+    assert response.get_json() == {"error": "unauthorized"}
+
+
+def test_revoke_token(client):
+    token = issue(client, username="api", password="secret").get_json()["token"]
+    assert client.delete("/api/v1/tokens", headers=bearer(token)).status_code == 204
+    assert client.get("/api/v1/portfolio", headers=bearer(token)).status_code == 401
+
+
+def test_quote_needs_symbol(client):
+    token = issue(client, username="api", password="secret").get_json()["token"]
+    for url in ("/api/v1/quote", "/api/v1/quote?symbol=", "/api/v1/quote?symbol=%20"):
+        response = client.get(url, headers=bearer(token))
+        assert response.status_code == 400
+        assert response.get_json() == {"error": "missing symbol"}
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+
+import pytest
+
+import cache
+from cache import QuoteCache
+
+
+class Upstream:
+    """Fetch that counts calls and answers each symbol with a price that rises per call."""
+
+    def __init__(self, invalid=(), error=None):
+        self.calls = []
+        self.invalid = invalid
+        self.error = error
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, symbol):
+        self.release.wait()
+        self.calls.append(symbol)
+        if self.error is not None:
+            raise self.error
+        if symbol in self.invalid:
+            return None
+        return {"symbol": symbol, "price": float(len(self.calls))}
+
+    async def fetch_async(self, symbol):
+        await asyncio.sleep(0.01)
+        return self(symbol)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace the cache's clock with one tests move by hand."""
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_ttl(clock):
+    upstream = Upstream()
+    quotes = QuoteCache(upstream, ttl=60)
+    assert quotes.get("aapl") == {"symbol": "AAPL", "price": 1.0}
+    clock[0] += 59
+    assert quotes.get("AAPL")["price"] == 1.0
+    clock[0] += 2
+    assert quotes.get("AAPL")["price"] == 2.0
+    assert upstream.calls == ["AAPL", "AAPL"]
+    assert (quotes.hits, quotes.misses) == (1, 2)
+
+
+def test_invalid_symbols_cached_for_negative_ttl(clock):
+    upstream = Upstream(invalid={"ZZZZ"})
+    quotes = QuoteCache(upstream, ttl=60, negative_ttl=300)
+    assert quotes.get("zzzz") is None
+    clock[0] += 200
+    assert quotes.get("ZZZZ") is None
+    assert upstream.calls == ["ZZZZ"]
+    clock[0] += 101
+    quotes.get("ZZZZ")
+    assert upstream.calls == ["ZZZZ", "ZZZZ"]
+
+
+def test_least_recently_used_evicted(clock):
+    quotes = QuoteCache(Upstream(), maxsize=2)
+    quotes.get("A")
+    quotes.get("B")
+    quotes.get("A")
+    quotes.get("C")
+    assert quotes.peek("A") is not None
+    assert quotes.peek("B") is None
+    assert quotes.peek("C") is not None
+
+
+def test_concurrent_misses_fetch_once():
+    upstream = Upstream()
+    upstream.release.clear()
+    quotes = QuoteCache(upstream)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(quotes.get("AAPL"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    upstream.release.set()
+    for thread in threads:
+        thread.join()
+    assert upstream.calls == ["AAPL"]
+    assert results == [{"symbol": "AAPL", "price": 1.0}] * 8
+
+
+def test_stale_quote_served_while_refreshing(clock):
+    upstream = Upstream()
+    quotes = QuoteCache(upstream, ttl=60, stale=30)
+    quotes.get("AAPL")
+    clock[0] += 70
+
+    # The stale quote comes back at once, and one refresh runs in the background
+    upstream.release.clear()
+    assert quotes.get("AAPL")["price"] == 1.0
+    assert quotes.get("AAPL")["price"] == 1.0
+    upstream.release.set()
+    for _ in range(100):
+        if quotes.peek("AAPL")["price"] == 2.0:
+            break
+        threading.Event().wait(0.01)
+    assert quotes.peek("AAPL")["price"] == 2.0
+    assert upstream.calls == ["AAPL", "AAPL"]
+
+    # Past the grace period, a miss waits for upstream
+    clock[0] += 100
+    assert quotes.get("AAPL")["price"] == 3.0
+
+
+def test_failure_logged_and_not_cached(clock, caplog):
+    upstream = Upstream()
+    quotes = QuoteCache(upstream, ttl=60)
+    quotes.get("AAPL")
+    clock[0] += 61
+    upstream.error = OSError("unreachable")
+
+    # Keep the last quote, but try upstream again on the next miss
+    assert quotes.get("AAPL")["price"] == 1.0
+    assert "Failed to fetch AAPL" in caplog.text
+    upstream.error = None
+    assert quotes.get("AAPL")["price"] == 3.0
+
+
+def test_concurrent_async_misses_fetch_once():
+    upstream = Upstream()
+    quotes = QuoteCache(upstream, fetch_async=upstream.fetch_async)
+
+    async def main():
+        return await asyncio.gather(*[quotes.get_async("aapl") for _ in range(8)])
+
+    assert asyncio.run(main()) == [{"symbol": "AAPL", "price": 1.0}] * 8
+    assert upstream.calls == ["AAPL"]
@@ -0,0 +1,43 @@
+from flask import Response
+
+from caching import IMMUTABLE, NO_STORE, policy, set_headers, static_url
+
+
+def test_static_policy():
+    assert policy("GET", "/static/styles.css", {"v": "abc"}, 200) == IMMUTABLE
+    assert policy("GET", "/static/styles.css", {}, 200) == "no-cache"
+    assert policy("GET", "/static/missing.css", {"v": "abc"}, 404) == "no-cache"
+
+
+def test_no_store_policy():
+    assert policy("POST", "/buy", {}, 200) == NO_STORE
+    assert policy("GET", "/", {}, 302) == NO_STORE
+    for path in ("/login", "/logout", "/register"):
+        assert policy("GET", path, {}, 200) == NO_STORE
+
+
+def test_private_policy():
+    assert policy("GET", "/quote", {"symbol": "AAPL"}, 200, quote_ttl=30.5) == "private, max-age=30"
+    assert policy("GET", "/quote", {}, 200) == "private, no-cache"
+    assert policy("HEAD", "/history", {}, 200) == "private, no-cache"
+
+
+def test_set_headers():
+    response = Response()
+    assert set_headers(response, "private, no-cache")
+    assert "Cookie" in response.vary
+
+    response = Response()
+    assert not set_headers(response, NO_STORE)
+    assert response.headers["Pragma"] == "no-cache"
+
+    response = Response()
+    assert not set_headers(response, IMMUTABLE)
+    assert response.headers["Cache-Control"] == IMMUTABLE
+
+
+def test_static_url(tmp_path):
+    (tmp_path / "styles.css").write_text("a")
+    first = static_url(str(tmp_path), "styles.css")
+    assert first.startswith("/static/styles.css?v=")
+    assert static_url(str(tmp_path), "missing.css") == "/static/missing.css"
@@ -0,0 +1,67 @@
+import time
+
+from werkzeug.security import generate_password_hash
+
+import hashing
+from hashing import HashingService, Throttle
+
+
+def test_throttle_limits_each_key(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(hashing.time, "monotonic", lambda: now[0])
+    throttle = Throttle(3, window=60)
+    assert [throttle.allow("a") for _ in range(4)] == [True, True, True, False]
+    assert throttle.allow("b")
+
+    # Attempts older than the window stop counting
+    now[0] += 61
+    assert throttle.allow("a")
+
+
+def test_throttle_reset():
+    throttle = Throttle(1)
+    assert throttle.allow("a")
+    assert not throttle.allow("a")
+    throttle.reset("a")
+    assert throttle.allow("a")
+
+
+def test_needs_rehash():
+    hasher = HashingService(method="pbkdf2:sha256:1000", workers=0)
+    assert not hasher.needs_rehash(generate_password_hash("pw", "pbkdf2:sha256:1000"))
+    assert hasher.needs_rehash(generate_password_hash("pw", "pbkdf2:sha256:2000"))
+    assert hasher.needs_rehash(generate_password_hash("pw", "scrypt:32768:8:1"))
+
+
+def test_check_and_generate_inline():
+    hasher = HashingService(method="pbkdf2:sha256:1000", workers=0)
+    pwhash = hasher.generate("pw")
+    assert pwhash.startswith("pbkdf2:sha256:1000$")
+    assert hasher.check(pwhash, "pw")
+    assert not hasher.check(pwhash, "wrong")
+
+
+def test_busy_while_pool_is_full():
+    hasher = HashingService(method="scrypt:32768:8:1", workers=1, max_queue=0, timeout=0.001)
+    try:
+
+        # A hash still running after its timeout keeps its slot, so the next one is turned away too
+        for _ in range(2):
+            try:
+                hasher.generate("pw")
+                assert False, "hashed within a millisecond"
+            except hashing.Busy:
+                pass
+
+        # Once it finishes, its slot is free again
+        hasher.timeout = 30
+        for _ in range(100):
+            try:
+                assert hasher.generate("pw").startswith("scrypt:")
+                break
+            except hashing.Busy:
+                time.sleep(0.05)
+        else:
+            assert False, "slot never freed"
+    finally:
+        hasher._pool.shutdown()
@@ -0,0 +1,84 @@
+import sqlite3
+
+import orders
+from orders import OrderBook, OrderScheduler
+
+
+def order(order_id, side, kind, price, symbol="AAPL"):
+    return {"id": order_id, "fkey": 1, "symbol": symbol, "side": side, "kind": kind, "shares": 1, "price": price}
+
+
+def ids(orders):
+    return sorted(order["id"] for order in orders)
+
+
+def test_triggered_by_direction():
+    book = OrderBook()
+    book.add(order(1, "buy", "limit", 10000))
+    book.add(order(2, "sell", "stop", 9000))
+    book.add(order(3, "sell", "limit", 11000))
+    book.add(order(4, "buy", "stop", 12000))
+
+    # Nothing fires between the thresholds
+    assert book.triggered("AAPL", 105.0) == []
+
+    # Falling prices fire buy limits and sell stops at or above the price
+    assert ids(book.triggered("AAPL", 100.0)) == [1]
+    assert ids(book.triggered("AAPL", 80.0)) == [2]
+
+    # Rising prices fire sell limits and buy stops at or below the price
+    assert ids(book.triggered("AAPL", 130.0)) == [3, 4]
+    assert book.symbols() == []
+
+
+def test_triggered_once():
+    book = OrderBook()
+    book.add(order(1, "buy", "limit", 10000))
+    book.add(order(1, "buy", "limit", 10000))
+    assert ids(book.triggered("AAPL", 99.0)) == [1]
+    assert book.triggered("AAPL", 99.0) == []
+
+
+def test_triggered_skips_removed():
+    book = OrderBook()
+    book.add(order(1, "buy", "limit", 10000))
+    book.add(order(2, "buy", "limit", 10000))
+    book.remove(1)
+    assert ids(book.triggered("AAPL", 100.0)) == [2]
+    assert book.symbols() == []
+
+
+def test_triggered_per_symbol():
+    book = OrderBook()
+    book.add(order(1, "buy", "limit", 10000, "AAPL"))
+    book.add(order(2, "buy", "limit", 10000, "MSFT"))
+    assert ids(book.triggered("MSFT", 50.0)) == [2]
+    assert book.symbols() == ["AAPL"]
+    assert book.last == 2
+
+
+def test_triggered_in_cents():
+    book = OrderBook()
+    book.add(order(1, "sell", "limit", 19133))
+    assert book.triggered("AAPL", 191.32) == []
+    assert ids(book.triggered("AAPL", 191.33)) == [1]
+
+
+def test_failed_fill_stays_in_book(db, user, monkeypatch):
+    order_id = db.execute("INSERT INTO orders (fkey, symbol, side, kind, shares, price, status, created) "
+                          "VALUES (:user_id, 'AAPL', 'buy', 'limit', 2, 10000, 'open', 0)", user_id=user)
+    scheduler = OrderScheduler(db, lambda symbols: {symbol: {"symbol": symbol, "price": 99.0} for symbol in symbols})
+
+    # A locked database fails the fill without failing the order
+    fill = orders.fill
+    def locked(*args):
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(orders, "fill", locked)
+    assert scheduler.poll() == 0
+    assert list(scheduler.book.orders) == [order_id]
+
+    monkeypatch.setattr(orders, "fill", fill)
+    assert scheduler.poll() == 1
+    assert scheduler.book.symbols() == []
+    assert db.execute("SELECT status FROM orders WHERE id = :order_id", order_id=order_id)[0]["status"] == "filled"
+    assert db.execute("SELECT cash FROM users WHERE id = :user_id", user_id=user)[0]["cash"] == 802
@@ -0,0 +1,41 @@
+from portfolio import DAY, replay
+from prices import PriceStore
+
+
+def trade(symbol, share, price, day):
+    return {"symbol": symbol, "share": share, "price": price, "time": day * DAY + 3600}
+
+
+TRADES = [trade("AAPL", 2, 1000, 0), trade("AAPL", -1, 2000, 2)]
+
+
+def test_replay_from_trades(tmp_path):
+    series = replay(TRADES, 990, PriceStore(str(tmp_path)), 3)
+    assert series == {
+        "days": ["1970-01-01", "1970-01-02", "1970-01-03", "1970-01-04"],
+        "cash": [970.0, 970.0, 990.0, 990.0],
+        "holdings": [20.0, 20.0, 20.0, 20.0],
+        "value": [990.0, 990.0, 1010.0, 1010.0],
+    }
+
+
+def test_replay_prices_from_store(tmp_path):
+    store = PriceStore(str(tmp_path))
+    # Only the day's last recorded price counts
+    store.append("AAPL", (DAY + 60, 12, 12, 12, 12, 1))
+    store.append("AAPL", (DAY + 120, 15, 15, 15, 15, 1))
+    store.append("AAPL", (3 * DAY, 30, 30, 30, 30, 1))
+    series = replay(TRADES, 990, store, 4)
+    assert series["holdings"] == [20.0, 30.0, 20.0, 30.0, 30.0]
+    assert series["value"] == [990.0, 1000.0, 1010.0, 1020.0, 1020.0]
+
+
+def test_replay_symbols_apart(tmp_path):
+    trades = [trade("AAPL", 1, 1000, 0), trade("MSFT", 2, 500, 1)]
+    series = replay(trades, 0, PriceStore(str(tmp_path)), 1)
+    assert series["cash"] == [10.0, 0.0]
+    assert series["holdings"] == [10.0, 20.0]
+
+
+def test_replay_nothing(tmp_path):
+    assert replay([], 1000, PriceStore(str(tmp_path)), 3) == dict(days=[], cash=[], holdings=[], value=[])
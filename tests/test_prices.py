@@ -0,0 +1,60 @@
+import numpy as np
+
+from prices import RECORD, PriceStore, downsample
+
+
+def bar(t, price, volume=1):
+    return (t, price, price + 1, price - 1, price, volume)
+
+
+def test_append_keeps_time_order_without_duplicates(tmp_path):
+    store = PriceStore(str(tmp_path))
+    assert [store.append("aapl", bar(t, t)) for t in (10, 11, 11, 5, 15)] == [True, True, False, False, True]
+    assert store.read("AAPL")["time"].tolist() == [10, 11, 15]
+
+    # Another store on the same files, as in another worker, sees what was written
+    other = PriceStore(str(tmp_path))
+    assert not other.append("AAPL", bar(15, 1))
+    assert other.append("AAPL", bar(16, 1))
+    assert not store.append("AAPL", bar(16, 1))
+    assert store.read("AAPL")["time"].tolist() == [10, 11, 15, 16]
+
+
+def test_append_rejects_unsafe_symbols(tmp_path):
+    store = PriceStore(str(tmp_path))
+    assert not store.append("../x", bar(1, 1))
+    assert not store.append("", bar(1, 1))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_read_range(tmp_path):
+    store = PriceStore(str(tmp_path))
+    for t in range(0, 100, 10):
+        store.append("AAPL", bar(t, t))
+    assert store.read("AAPL", 20, 50)["time"].tolist() == [20, 30, 40]
+    assert store.read("AAPL", 95).size == 0
+    assert store.read("MSFT").size == 0
+
+
+def test_observe(tmp_path):
+    store = PriceStore(str(tmp_path))
+    quote = {"symbol": "AAPL", "price": 190.0}
+    assert store.observe(quote) is quote
+    assert store.observe(None) is None
+    assert store.read("AAPL")["close"].tolist() == [190.0]
+
+
+def test_downsample():
+    records = np.array([bar(10, 10, 1), bar(15, 16, 2), bar(19, 12, 3), bar(30, 30, 4), bar(31, 31, 5)], dtype=RECORD)
+    assert downsample(records, 0, 10) == {
+        "time": [10, 30],
+        "open": [10.0, 30.0],
+        "high": [17.0, 32.0],
+        "low": [9.0, 29.0],
+        "close": [12.0, 31.0],
+        "volume": [6.0, 9.0],
+    }
+
+
+def test_downsample_nothing():
+    assert downsample(np.empty(0, dtype=RECORD), 0, 10) == {name: [] for name in RECORD.names}
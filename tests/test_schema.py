@@ -0,0 +1,80 @@
+import sqlite3
+import time
+
+from database import Database
+from schema import MIGRATIONS, migrate
+
+
+def run(path, sql, *params):
+    """Run sql on the database at path directly, outside the app's pool."""
+    with sqlite3.connect(path) as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+def migrated(path):
+    """Return a database at path with every migration applied."""
+    db = Database(path)
+    db.setup = migrate
+    return db
+
+
+def test_migrations_applied_once(bundled):
+    db = migrated(bundled)
+    assert [row["name"] for row in db.execute("SELECT name FROM migrations")] == [name for name, steps in MIGRATIONS]
+
+    # Running them again changes nothing
+    history = db.execute("SELECT * FROM history ORDER BY id")
+    migrate(db)
+    assert db.execute("SELECT * FROM history ORDER BY id") == history
+
+
+def test_history_paged_by_index(bundled):
+    db = migrated(bundled)
+    plan = db.execute("EXPLAIN QUERY PLAN SELECT * FROM history WHERE fkey = :user_id AND id < :before "
+                      "ORDER BY id DESC LIMIT 50", user_id=16, before=2 ** 63 - 1)
+    assert any("history_fkey_id" in row["detail"] for row in plan)
+
+
+def test_buy_fkey_symbol_merges_duplicates(bundled):
+    run(bundled, "INSERT INTO buy (fkey, symbol, share) VALUES (16, 'AAPL', 2), (16, 'MSFT', 1), (16, 'MSFT', 3)")
+    expected = dict(run(bundled, "SELECT symbol, SUM(share) FROM buy WHERE fkey = 16 GROUP BY symbol"))
+
+    db = migrated(bundled)
+    rows = db.execute("SELECT symbol, share FROM buy WHERE fkey = 16 ORDER BY symbol")
+    assert {row["symbol"]: row["share"] for row in rows} == expected == {"AAPL": 6, "MSFT": 4}
+    assert len(rows) == len(expected)
+
+    # Holdings are now unique per user and symbol
+    assert db.execute("SELECT name FROM sqlite_master WHERE name = 'buy_fkey_symbol'")
+
+
+def test_buy_cost_backfilled_at_average_cost(bundled):
+    db = migrated(bundled)
+
+    # Bought 5 AAPL at $191.33 then sold 1, leaving 4 at their average cost
+    assert db.execute("SELECT share, cost FROM buy WHERE fkey = 16 AND symbol = 'AAPL'") == [
+        {"share": 4, "cost": 765.32}]
+
+
+def test_history_numeric(bundled):
+    before = run(bundled, "SELECT id, fkey, symbol, price, share, time FROM history ORDER BY id")
+    assert before and all(isinstance(price, str) and isinstance(when, str) for _, _, _, price, _, when in before)
+
+    db = migrated(bundled)
+    after = db.execute("SELECT id, fkey, symbol, price, share, time FROM history ORDER BY id")
+
+    # Prices like $191.33 become cents and local times epoch seconds, keeping ids, users, symbols and shares
+    assert [(row["id"], row["fkey"], row["symbol"], row["price"], row["share"], row["time"]) for row in after] == [
+        (id, fkey, symbol, round(float(price.strip("$").replace(",", "")) * 100), share,
+         int(time.mktime(time.strptime(when, "%Y-%m-%d %H:%M:%S"))))
+        for id, fkey, symbol, price, share, when in before]
+    assert db.execute("SELECT typeof(price) AS price, typeof(time) AS time FROM history GROUP BY 1, 2") == [
+        {"price": "integer", "time": "integer"}]
+    assert db.execute("SELECT name FROM sqlite_master WHERE name = 'history_fkey_id'")
+
+
+def test_site_stats_backfilled(bundled):
+    expected = run(bundled, "SELECT COUNT(*), SUM(cash) FROM users")[0]
+    db = migrated(bundled)
+    assert tuple(db.execute("SELECT users, cash FROM site_stats")[0].values()) == expected
+    assert not db.execute("SELECT name FROM sqlite_master WHERE name = 'buy_symbol'")
@@ -0,0 +1,84 @@
+import pytest
+
+from flask import Flask, session
+
+from sessions import SqliteSessionInterface
+
+
+@pytest.fixture
+def app(db):
+    """Return an app keeping sessions in db, with routes to read, set and clear them."""
+    app = Flask(__name__)
+    app.session_interface = SqliteSessionInterface(db, lifetime=3600)
+
+    @app.route("/get")
+    def get():
+        return str(session.get("user_id"))
+
+    @app.route("/set/<int:user_id>")
+    def set(user_id):
+        session.clear()
+        session["user_id"] = user_id
+        return ""
+
+    @app.route("/clear")
+    def clear():
+        session.clear()
+        return ""
+
+    @app.teardown_request
+    def release(exception):
+        db.release()
+
+    return app
+
+
+def sessions(db):
+    return db.execute("SELECT sid, data, expires FROM sessions")
+
+
+def test_session_stored_and_read(app, db):
+    client = app.test_client()
+    assert client.get("/get").data == b"None"
+    assert sessions(db) == []
+
+    client.get("/set/7")
+    assert client.get("/get").data == b"7"
+    assert [row["data"] for row in sessions(db)] == ['{"user_id":7}']
+
+    # Another client doesn't see it
+    assert app.test_client().get("/get").data == b"None"
+
+
+def test_session_id_regenerated_on_login(app, db):
+    client = app.test_client()
+    client.get("/set/7")
+    first = sessions(db)[0]["sid"]
+    client.get("/set/8")
+    assert [row["sid"] for row in sessions(db)] != [first]
+    assert len(sessions(db)) == 1
+    assert client.get("/get").data == b"8"
+
+
+def test_cleared_session_deleted(app, db):
+    client = app.test_client()
+    client.get("/set/7")
+    client.get("/clear")
+    assert sessions(db) == []
+    assert client.get("/get").data == b"None"
+
+
+def test_unchanged_session_not_rewritten(app, db):
+    client = app.test_client()
+    client.get("/set/7")
+    db.execute("UPDATE sessions SET data = '{\"user_id\":9}'")
+    client.get("/get")
+    assert client.get("/get").data == b"9"
+    assert sessions(db)[0]["data"] == '{"user_id":9}'
+
+
+def test_expired_session_ignored(app, db):
+    client = app.test_client()
+    client.get("/set/7")
+    db.execute("UPDATE sessions SET expires = 0")
+    assert client.get("/get").data == b"None"
@@ -0,0 +1,75 @@
+import asyncio
+import queue
+
+from streams import AsyncSignal, PricePoller
+
+
+class Prices:
+    """lookup_many over a dict of prices tests can change, optionally failing once."""
+
+    def __init__(self, **prices):
+        self.prices = prices
+        self.fail = False
+
+    def __call__(self, symbols):
+        if self.fail:
+            self.fail = False
+            raise OSError("unreachable")
+        return {symbol: {"symbol": symbol, "price": self.prices[symbol]} for symbol in symbols if symbol in self.prices}
+
+
+def test_signalled_when_price_changes():
+    prices = Prices(AAPL=100.0, MSFT=200.0)
+    poller = PricePoller(prices, interval=0.01)
+    signal = poller.subscribe(["aapl"])
+    signal.get(timeout=1)
+    assert poller.quotes(["aapl"]) == {"AAPL": {"symbol": "AAPL", "price": 100.0}}
+
+    # Only changes to watched symbols signal
+    prices.prices["MSFT"] = 201.0
+    try:
+        signal.get(timeout=0.1)
+        assert False, "signalled for an unwatched symbol"
+    except queue.Empty:
+        pass
+    prices.prices["AAPL"] = 101.0
+    signal.get(timeout=1)
+    assert poller.quotes(["AAPL"])["AAPL"]["price"] == 101.0
+
+
+def test_resubscribe_keeps_prices_of_symbols_still_watched():
+    poller = PricePoller(Prices(AAPL=100.0, MSFT=200.0), interval=60)
+    signal = poller.subscribe(["AAPL", "MSFT"])
+    signal.get(timeout=1)
+    assert set(poller.quotes(["AAPL", "MSFT"])) == {"AAPL", "MSFT"}
+
+    poller.resubscribe(signal, ["AAPL", "MSFT"], ["AAPL", "AEG"])
+    assert set(poller.quotes(["AAPL", "AEG"])) == {"AAPL"}
+    assert poller.quotes(["MSFT"]) == {}
+
+    poller.unsubscribe(signal, ["AAPL", "AEG"])
+    assert poller.quotes(["AAPL"]) == {}
+
+
+def test_poller_survives_failed_poll(caplog):
+    prices = Prices(AAPL=100.0)
+    prices.fail = True
+    poller = PricePoller(prices, interval=0.01)
+    signal = poller.subscribe(["AAPL"])
+    signal.get(timeout=1)
+    assert "Failed to poll prices" in caplog.text
+    assert poller.quotes(["AAPL"])["AAPL"]["price"] == 100.0
+
+
+def test_async_signal():
+    poller = PricePoller(Prices(AAPL=100.0), interval=0.01)
+
+    async def main():
+        signal = poller.subscribe(["AAPL"], AsyncSignal())
+        try:
+            await signal.get(timeout=1)
+        finally:
+            poller.unsubscribe(signal, ["AAPL"])
+        return poller.quotes(["AAPL"])
+
+    assert asyncio.run(main()) == {}
@@ -0,0 +1,135 @@
+import pytest
+
+import trades
+
+
+def snapshot(db, user_id):
+    """Return everything a trade by user may change."""
+    return (db.execute("SELECT cash FROM users WHERE id = :user_id", user_id=user_id),
+            db.execute("SELECT symbol, share, cost FROM buy WHERE fkey = :user_id ORDER BY symbol", user_id=user_id),
+            db.execute("SELECT symbol, price, share FROM history WHERE fkey = :user_id ORDER BY id", user_id=user_id),
+            db.execute("SELECT * FROM rollups WHERE fkey = :user_id ORDER BY symbol", user_id=user_id),
+            db.execute("SELECT * FROM symbol_stats ORDER BY symbol"),
+            db.execute("SELECT * FROM site_stats"))
+
+
+def cash(db, user_id):
+    return db.execute("SELECT cash FROM users WHERE id = :user_id", user_id=user_id)[0]["cash"]
+
+
+def holdings(db, user_id):
+    return {row["symbol"]: (row["share"], row["cost"])
+            for row in db.execute("SELECT symbol, share, cost FROM buy WHERE fkey = :user_id", user_id=user_id)}
+
+
+def test_buy(db, user):
+    trades.buy(db, user, "AAPL", 2, 100.0)
+    trades.buy(db, user, "AAPL", 1, 150.0)
+    assert cash(db, user) == 650
+    assert holdings(db, user) == {"AAPL": (3, 350)}
+    assert [(row["price"], row["share"]) for row in db.execute(
+        "SELECT price, share FROM history WHERE fkey = :user_id ORDER BY id", user_id=user)] == [(10000, 2), (15000, 1)]
+    rollup = db.execute("SELECT bought, sold, volume FROM rollups WHERE fkey = :user_id", user_id=user)
+    assert rollup == [{"bought": 3, "sold": 0, "volume": 35000}]
+
+
+def test_buy_unaffordable_changes_nothing(db, user):
+    before = snapshot(db, user)
+    with pytest.raises(trades.TradeError, match="afford"):
+        trades.buy(db, user, "AAPL", 11, 100.0)
+    assert snapshot(db, user) == before
+
+
+def test_sell_at_average_cost(db, user):
+    trades.buy(db, user, "AAPL", 2, 100.0)
+    trades.buy(db, user, "AAPL", 2, 200.0)
+    trades.sell(db, user, "AAPL", 1, 250.0)
+    assert cash(db, user) == 650
+    assert holdings(db, user) == {"AAPL": (3, 450)}
+    assert db.execute("SELECT realized FROM rollups WHERE fkey = :user_id", user_id=user)[0]["realized"] == 10000
+
+    # Selling the rest removes the holding
+    trades.sell(db, user, "AAPL", 3, 100.0)
+    assert holdings(db, user) == {}
+
+
+def test_sell_too_many_changes_nothing(db, user):
+    trades.buy(db, user, "AAPL", 2, 100.0)
+    before = snapshot(db, user)
+    with pytest.raises(trades.TradeError, match="too many"):
+        trades.sell(db, user, "AAPL", 3, 100.0)
+    with pytest.raises(trades.TradeError, match="too many"):
+        trades.sell(db, user, "MSFT", 1, 100.0)
+    assert snapshot(db, user) == before
+
+
+def test_batch_fills_sells_before_buys(db, user):
+    trades.buy(db, user, "AAPL", 5, 100.0)
+    quotes = {"AAPL": {"symbol": "AAPL", "price": 100.0}, "MSFT": {"symbol": "MSFT", "price": 200.0}}
+
+    # The buy costs more than the cash left, but not more than the sale's proceeds added to it
+    filled = trades.batch(db, user, [("buy", "MSFT", 4), ("sell", "AAPL", 5)], quotes)
+    assert sorted(filled) == [("buy", "MSFT", 4, 200.0), ("sell", "AAPL", 5, 100.0)]
+    assert cash(db, user) == 200
+    assert holdings(db, user) == {"MSFT": (4, 800)}
+
+
+def test_batch_combines_orders(db, user):
+    quotes = {"AAPL": {"symbol": "AAPL", "price": 100.0}}
+    assert trades.batch(db, user, [("buy", "AAPL", 1), ("buy", "AAPL", 2)], quotes) == [("buy", "AAPL", 3, 100.0)]
+    assert holdings(db, user) == {"AAPL": (3, 300)}
+
+
+def test_batch_rolls_back_every_order(db, user):
+    trades.buy(db, user, "AAPL", 2, 100.0)
+    quotes = {"AAPL": {"symbol": "AAPL", "price": 100.0}, "MSFT": {"symbol": "MSFT", "price": 200.0}}
+    before = snapshot(db, user)
+
+    # The sale is filled first, then undone when the buy can't be afforded
+    with pytest.raises(trades.TradeError, match="afford"):
+        trades.batch(db, user, [("sell", "AAPL", 1), ("buy", "MSFT", 10)], quotes)
+    assert snapshot(db, user) == before
+
+    with pytest.raises(trades.TradeError, match="too many"):
+        trades.batch(db, user, [("buy", "MSFT", 1), ("sell", "AAPL", 3)], quotes)
+    assert snapshot(db, user) == before
+
+
+def test_batch_rejects_unquoted_symbols(db, user):
+    before = snapshot(db, user)
+    with pytest.raises(trades.TradeError, match="invalid symbol"):
+        trades.batch(db, user, [("buy", "AAPL", 1), ("buy", "ZZZZ", 1)], {"AAPL": {"symbol": "AAPL", "price": 1.0}})
+    assert snapshot(db, user) == before
+
+
+@pytest.mark.parametrize("side, symbol, shares, expected", [
+    ("buy", "aapl", "3", ("buy", "AAPL", 3)),
+    ("sell", "AAPL", 2, ("sell", "AAPL", 2)),
+    ("buy", "AAPL", 2.0, ("buy", "AAPL", 2)),
+])
+def test_parse_order(side, symbol, shares, expected):
+    assert trades.parse_order(side, symbol, shares) == expected
+
+
+@pytest.mark.parametrize("side, symbol, shares", [
+    ("hold", "AAPL", 1),
+    ("buy", "", 1),
+    ("buy", 123, 1),
+    ("buy", ["AAPL"], 1),
+    ("buy", "AAPL", 0),
+    ("buy", "AAPL", "1.5"),
+    ("buy", "AAPL", 1.9),
+    ("buy", "AAPL", True),
+    ("buy", "AAPL", None),
+    ("buy", "AAPL", float("inf")),
+])
+def test_parse_order_rejects(side, symbol, shares):
+    with pytest.raises(trades.TradeError):
+        trades.parse_order(side, symbol, shares)
+
+
+def test_site_stats_follow_cash(db, user):
+    trades.buy(db, user, "AAPL", 3, 100.0)
+    trades.sell(db, user, "AAPL", 1, 120.0)
+    totals = db.execute("SELECT COUNT(*) AS users, SUM(cash) AS cash FROM users")[0]
+    assert db.execute("SELECT users, cash FROM site_stats")[0] == pytest.approx(totals)
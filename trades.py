@@ -0,0 +1,103 @@
+import time
+
+import analytics
+from helpers import cents
+
+
+class TradeError(Exception):
+    """Raised when an order can't be filled, with a message fit for apology()."""
+
+
+def buy(db, user_id, symbol, shares, price):
+    """Buy shares of symbol at price for user as one transaction."""
+    cost = shares * price
+
+    with db.transaction():
+
+        # Take the cash only if user can afford it
+        if db.execute("UPDATE users SET cash = cash - :cost WHERE id = :user_id AND cash >= :cost",
+                      cost=cost, user_id=user_id) != 1:
+            raise TradeError("can`t afford")
+
+        # Add to the holding and its cost basis, creating it if it's new
+        db.execute("INSERT INTO buy (fkey, symbol, share, cost) VALUES (:user_id, :symbol, :shares, :cost) "
+                   "ON CONFLICT (fkey, symbol) DO UPDATE SET share = share + excluded.share, cost = cost + excluded.cost",
+                   user_id=user_id, symbol=symbol, shares=shares, cost=cost)
+
+        record(db, user_id, symbol, shares, price)
+        analytics.update(db, user_id, symbol, shares, price)
+
+
+def sell(db, user_id, symbol, shares, price):
+    """Sell shares of symbol at price for user as one transaction."""
+    with db.transaction():
+
+        # Ensure user owns enough shares, which are sold at their average cost
+        held = db.execute("SELECT share, cost FROM buy WHERE fkey = :user_id AND symbol = :symbol",
+                          user_id=user_id, symbol=symbol)
+        if not held or held[0]["share"] < shares:
+            raise TradeError("too many shares")
+        basis = held[0]["cost"] * shares / held[0]["share"]
+
+        # Take the shares and their cost
+        db.execute("UPDATE buy SET share = share - :shares, cost = cost - :basis WHERE fkey = :user_id AND symbol = :symbol",
+                   shares=shares, basis=basis, user_id=user_id, symbol=symbol)
+
+        # Delete the holding if no shares are left
+        db.execute("DELETE FROM buy WHERE fkey = :user_id AND symbol = :symbol AND share = 0",
+                   user_id=user_id, symbol=symbol)
+
+        db.execute("UPDATE users SET cash = cash + :proceeds WHERE id = :user_id",
+                   proceeds=shares * price, user_id=user_id)
+
+        record(db, user_id, symbol, -shares, price)
+        analytics.update(db, user_id, symbol, -shares, price, realized=shares * price - basis)
+
+
+def parse_order(side, symbol, shares):
+    """Return a (side, symbol, shares) order from raw input, raising TradeError if invalid."""
+    if side not in ("buy", "sell"):
+        raise TradeError("invalid side")
+    if not symbol:
+        raise TradeError("missing symbol")
+    if not isinstance(symbol, str):
+        raise TradeError("invalid symbol")
+
+    # Take whole numbers of shares only, from JSON numbers as well as form text
+    if isinstance(shares, bool) or isinstance(shares, float) and not shares.is_integer():
+        raise TradeError("invalid share")
+    try:
+        shares = int(shares)
+    except (TypeError, ValueError, OverflowError):
+        raise TradeError("invalid share")
+    if not shares >= 1:
+        raise TradeError("invalid share")
+    return side, symbol.upper(), shares
+
+
+def batch(db, user_id, orders, quotes):
+    """
+    Fill (side, symbol, shares) orders at quotes' prices, all or nothing, as one transaction.
+
+    Orders for the same side and symbol are combined, and sells are filled before
+    buys so that their proceeds can pay for them.
+    """
+    combined = {}
+    for side, symbol, shares in orders:
+        if symbol not in quotes:
+            raise TradeError("invalid symbol")
+        combined[side, symbol] = combined.get((side, symbol), 0) + shares
+
+    with db.transaction():
+        for (side, symbol), shares in sorted(combined.items(), key=lambda order: order[0][0] != "sell"):
+            if side == "sell":
+                sell(db, user_id, symbol, shares, quotes[symbol]["price"])
+            else:
+                buy(db, user_id, symbol, shares, quotes[symbol]["price"])
+    return [(side, symbol, shares, quotes[symbol]["price"]) for (side, symbol), shares in combined.items()]
+
+
+def record(db, user_id, symbol, shares, price):
+    """Add a trade to user's history, with negative shares for a sale."""
+    db.execute("INSERT INTO history (fkey, symbol, price, share, time) VALUES (:nfkey, :nsymbol, :nprice, :nshare, :ntime)",
+               nfkey=user_id, nsymbol=symbol, nprice=cents(price), nshare=shares, ntime=int(time.time()))